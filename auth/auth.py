@@ -1,30 +1,185 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+import jwt
+import orjson
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
-from typing import Optional
+from passlib.hash import bcrypt as bcrypt_hash
+from datetime import timedelta
+from typing import Optional, Tuple
+from collections import OrderedDict, namedtuple
+from cachetools import TTLCache
+import asyncio
+import concurrent.futures
+import hashlib
 import httpx
+import logging
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 
+from database.cache import cache_incr, is_revoked, store_revocation
 from database.database import get_db
 from database.models import User
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Security configuration
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
-ALGORITHM = "HS256"
+ALGORITHM = "EdDSA"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+def _load_pem(name: str) -> Optional[bytes]:
+    value = os.getenv(name)
+    # Hosting dashboards often store PEMs on a single line with literal \n
+    return value.replace("\\n", "\n").encode() if value else None
+
+def _load_signing_keys():
+    """Load the Ed25519 keypair used to sign and verify access tokens"""
+    private_pem = _load_pem("JWT_PRIVATE_KEY")
+    public_pem = _load_pem("JWT_PUBLIC_KEY")
+    
+    if private_pem:
+        private_key = serialization.load_pem_private_key(private_pem, password=None)
+    elif os.getenv("ENVIRONMENT") == "development":
+        # A per-process key: tokens don't work across workers or restarts
+        logger.warning("JWT_PRIVATE_KEY not set, using an ephemeral development key")
+        private_key = Ed25519PrivateKey.generate()
+    else:
+        # Fail at startup rather than have every worker sign with its own key
+        raise RuntimeError(
+            "JWT_PRIVATE_KEY is not set (JWT_SECRET_KEY is no longer used); "
+            "set ENVIRONMENT=development to run with an ephemeral key"
+        )
+    
+    if public_pem:
+        public_key = serialization.load_pem_public_key(public_pem)
+    else:
+        public_key = private_key.public_key()
+    return private_key, public_key
+
+PRIVATE_KEY, PUBLIC_KEY = _load_signing_keys()
+
+# Public key set for services that only need to verify tokens
+JWKS = {
+    "keys": [
+        {**jwt.algorithms.OKPAlgorithm.to_jwk(PUBLIC_KEY, as_dict=True), "use": "sig", "alg": ALGORITHM}
+    ]
+}
+
+# Single-algorithm JWS built once; tokens are signed and verified directly
+# against the parsed key objects above
+_ALGORITHMS = [ALGORITHM]
+_JWS = jwt.PyJWS(algorithms=_ALGORITHMS)
+
+# Password hashing - argon2id for new hashes, existing bcrypt hashes (and
+# argon2 hashes with older parameters) are upgraded transparently on the
+# next successful signin. Cost follows the OWASP argon2id minimum
+# (19 MiB, 2 iterations, 1 lane) to keep signin CPU and memory bounded
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__rounds=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1
+)
+# Require the native bcrypt backend (startup fails instead of falling back
+# to a slow one) and pay passlib's lazy setup here, not on the first signin
+bcrypt_hash.set_backend("bcrypt")
+# Verified against when there is no stored hash, so unknown emails cost the
+# same as wrong passwords and signin timing doesn't reveal registered users
+DUMMY_PASSWORD_HASH = pwd_context.hash("not-a-real-password")
+
+def _verify_seconds(hashed_password: str) -> float:
+    started = time.perf_counter()
+    pwd_context.verify("not-a-real-password", hashed_password)
+    return time.perf_counter() - started
+
+# Legacy bcrypt hashes take about 10x longer to check than argon2 ones, so a
+# slow failure would single out a registered legacy account. Failed signins
+# are held to a floor above the bcrypt cost, measured once here with headroom
+SIGNIN_FAILURE_FLOOR = 1.5 * _verify_seconds(pwd_context.handler("bcrypt").hash("not-a-real-password"))
+logger.info(f"bcrypt backend: {bcrypt_hash.get_backend()}")
+
+# Password hashing is CPU-bound, so run it off the event loop
+_BCRYPT_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Decoded token cache: blake2b(token) -> (payload, cached_until)
+TOKEN_CACHE_SIZE = 10_000
+TOKEN_CACHE_TTL = 60
+_token_cache: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict()
+
+# Revoked tokens live in the shared revocation store so every worker
+# rejects them, keyed by token digest and kept only until the token expires
+REVOKED_TOKEN_PREFIX = "revoked:"
+
+# Columns loaded for the authenticated user; password hashes and reset /
+# verification tokens are loaded on demand by the routes that need them
+CURRENT_USER_COLUMNS = (
+    User.id,
+    User.email,
+    User.username,
+    User.full_name,
+    User.avatar_url,
+    User.company_name,
+    User.user_type,
+    User.subscription_tier,
+    User.is_verified,
+    User.is_active,
+    User.token_version
+)
+
+# Hot user lookups, built once and reused with bound parameters. Email
+# lookups hit the unique users.email index and load only the columns the
+# calling routes read
+USER_BY_EMAIL = (
+    select(User)
+    .options(load_only(*CURRENT_USER_COLUMNS))
+    .where(User.email == bindparam("email"))
+)
+USER_CREDENTIALS_BY_EMAIL = (
+    select(User)
+    .options(load_only(*CURRENT_USER_COLUMNS, User.hashed_password))
+    .where(User.email == bindparam("email"))
+)
+USER_RESET_BY_EMAIL = (
+    select(User)
+    .options(load_only(User.id, User.reset_token, User.reset_token_expires, User.token_version))
+    .where(User.email == bindparam("email"))
+)
+USER_BY_GITHUB_ID = select(User).where(User.github_id == bindparam("github_id"))
+
+# Detached snapshot of the authenticated user; safe to keep across requests
+CurrentUser = namedtuple("CurrentUser", [column.key for column in CURRENT_USER_COLUMNS])
+
+# Authenticated user cache: user id -> CurrentUser. Short TTL bounds how long
+# a change made by another worker can go unnoticed
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL = 30
+_user_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Shared GitHub client so logins reuse pooled TLS connections
+_gh_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(10.0),
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+)
 
 # Security
 security = HTTPBearer()
 
+# Reverse proxies in front of the app (1 on Render). Without this, every
+# request appears to come from the proxy and per-IP limits become site-wide
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -33,29 +188,92 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_BCRYPT_POOL, pwd_context.verify, plain_password, hashed_password)
+
+async def averify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored one is deprecated"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_BCRYPT_POOL, pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_BCRYPT_POOL, pwd_context.hash, password)
+
+async def pad_failed_signin(started: float) -> None:
+    """Hold a failed signin until SIGNIN_FAILURE_FLOOR has passed since started"""
+    remaining = SIGNIN_FAILURE_FLOOR - (time.monotonic() - started)
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    expires_in = int(expires_delta.total_seconds()) if expires_delta else 900
+    to_encode["exp"] = int(time.time()) + expires_in
+    return _JWS.encode(orjson.dumps(to_encode), PRIVATE_KEY, algorithm=ALGORITHM)
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
 
 def verify_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token, reusing recently decoded payloads"""
+    key = _token_digest(token)
+    now = time.time()
+    cached = _token_cache.get(key)
+    if cached is not None:
+        payload, cached_until = cached
+        if cached_until > now:
+            _token_cache.move_to_end(key)
+            return payload
+        del _token_cache[key]
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
+        payload = orjson.loads(_JWS.decode(token, PUBLIC_KEY, algorithms=_ALGORITHMS))
+    except (jwt.InvalidTokenError, orjson.JSONDecodeError):
         return None
+    
+    # exp is the only registered claim these tokens carry
+    exp = payload.get("exp") if isinstance(payload, dict) else None
+    if not isinstance(exp, int) or exp <= now:
+        return None
+    
+    # Never cache past the token's own expiry
+    cached_until = min(exp, now + TOKEN_CACHE_TTL)
+    _token_cache[key] = (payload, cached_until)
+    if len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+    return payload
+
+def invalidate_user(user_id) -> None:
+    """Drop a user from the authenticated user cache after it changes"""
+    _user_cache.pop(uuid.UUID(str(user_id)), None)
+
+def _revoked_key(token: str) -> str:
+    return REVOKED_TOKEN_PREFIX + _token_digest(token).hex()
+
+async def revoke_token(token: str) -> None:
+    """Revoke a token so it is rejected until it expires"""
+    payload = verify_token(token)
+    if payload is None:
+        return
+    
+    _token_cache.pop(_token_digest(token), None)
+    remaining = payload["exp"] - int(time.time())
+    if remaining > 0:
+        await store_revocation(_revoked_key(token), remaining)
+
+async def is_token_revoked(token: str) -> bool:
+    """Check whether a token was revoked by any worker"""
+    return await is_revoked(_revoked_key(token))
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
     """Get current user from JWT token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,26 +283,67 @@ async def get_current_user(
     
     try:
         payload = verify_token(credentials.credentials)
-        if payload is None:
+        if payload is None or await is_token_revoked(credentials.credentials):
             raise credentials_exception
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        user_uuid = uuid.UUID(user_id)
+    except (jwt.InvalidTokenError, ValueError):
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    token_version = payload.get("ver", 0)
+    user = _user_cache.get(user_uuid)
+    # A newer version than cached means the password changed in another
+    # worker, whose invalidate_user didn't reach this cache
+    if user is None or token_version > user.token_version:
+        db_user = await db.get(User, user_uuid, options=[load_only(*CURRENT_USER_COLUMNS)])
+        if db_user is None:
+            raise credentials_exception
+        user = CurrentUser(*(getattr(db_user, field) for field in CurrentUser._fields))
+        _user_cache[user_uuid] = user
+    
+    # Tokens issued before the last password change/reset are revoked
+    if token_version != user.token_version:
         raise credentials_exception
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-async def authenticate_github_user(code: str, db: Session) -> Optional[User]:
+def client_ip(request: Request) -> str:
+    """Address of the calling client, as seen by the outermost trusted proxy"""
+    if TRUSTED_PROXY_HOPS:
+        # Each trusted proxy appends the address it received the request from,
+        # so anything further left is client-supplied and can be forged
+        forwarded = [addr.strip() for addr in request.headers.get("x-forwarded-for", "").split(",") if addr.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+async def check_rate_limit(key: str, limit: int, window: int):
+    """Reject with 429 once key has been hit more than limit times in window"""
+    if await cache_incr(key, window) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(window)}
+        )
+
+def rate_limit(scope: str, limit: int, window: int):
+    """Dependency allowing each client IP limit calls to a route per window seconds"""
+    async def dependency(request: Request):
+        await check_rate_limit(f"rl:{scope}:ip:{client_ip(request)}", limit, window)
+    return dependency
+
+async def close_github_client():
+    """Close the shared GitHub HTTP client"""
+    await _gh_client.aclose()
+
+async def authenticate_github_user(code: str, db: AsyncSession) -> Optional[User]:
     """Authenticate user with GitHub OAuth"""
     github_client_id = os.getenv("GITHUB_CLIENT_ID")
     github_client_secret = os.getenv("GITHUB_CLIENT_SECRET")
@@ -93,75 +352,67 @@ async def authenticate_github_user(code: str, db: Session) -> Optional[User]:
         raise HTTPException(status_code=500, detail="GitHub OAuth not configured")
     
     # Exchange code for access token
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(
-            "https://github.com/login/oauth/access_token",
-            data={
-                "client_id": github_client_id,
-                "client_secret": github_client_secret,
-                "code": code
-            },
-            headers={"Accept": "application/json"}
-        )
-        
-        if token_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get access token")
-        
-        token_data = token_response.json()
-        access_token = token_data.get("access_token")
-        
-        if not access_token:
-            raise HTTPException(status_code=400, detail="No access token received")
-        
-        # Get user info from GitHub
-        user_response = await client.get(
-            "https://api.github.com/user",
-            headers={
-                "Authorization": f"token {access_token}",
-                "Accept": "application/vnd.github.v3+json"
-            }
-        )
-        
-        if user_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get user info")
-        
-        github_user = user_response.json()
-        
-        # Get user email
-        emails_response = await client.get(
-            "https://api.github.com/user/emails",
-            headers={
-                "Authorization": f"token {access_token}",
-                "Accept": "application/vnd.github.v3+json"
-            }
+    client = _gh_client
+    token_response = await client.post(
+        "https://github.com/login/oauth/access_token",
+        data={
+            "client_id": github_client_id,
+            "client_secret": github_client_secret,
+            "code": code
+        },
+        headers={"Accept": "application/json"}
+    )
+    
+    if token_response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to get access token")
+    
+    token_data = orjson.loads(token_response.content)
+    access_token = token_data.get("access_token")
+    
+    if not access_token:
+        raise HTTPException(status_code=400, detail="No access token received")
+    
+    # Get user info and emails from GitHub concurrently
+    github_headers = {
+        "Authorization": f"token {access_token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    user_response, emails_response = await asyncio.gather(
+        client.get("https://api.github.com/user", headers=github_headers),
+        client.get("https://api.github.com/user/emails", headers=github_headers)
+    )
+    
+    if user_response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to get user info")
+    
+    github_user = orjson.loads(user_response.content)
+    
+    emails = orjson.loads(emails_response.content) if emails_response.status_code == 200 else []
+    primary_email = next((email["email"] for email in emails if email["primary"]), None)
+    
+    # Check if user exists
+    result = await db.execute(USER_BY_GITHUB_ID, {"github_id": str(github_user["id"])})
+    user = result.scalar_one_or_none()
+    
+    if not user:
+        # Create new user
+        user = User(
+            github_id=str(github_user["id"]),
+            email=primary_email or github_user.get("email", ""),
+            username=github_user["login"],
+            full_name=github_user.get("name", ""),
+            avatar_url=github_user.get("avatar_url", ""),
+            is_verified=True
         )
-        
-        emails = emails_response.json() if emails_response.status_code == 200 else []
-        primary_email = next((email["email"] for email in emails if email["primary"]), None)
-        
-        # Check if user exists
-        user = db.query(User).filter(User.github_id == str(github_user["id"])).first()
-        
-        if not user:
-            # Create new user
-            user = User(
-                github_id=str(github_user["id"]),
-                email=primary_email or github_user.get("email", ""),
-                username=github_user["login"],
-                full_name=github_user.get("name", ""),
-                avatar_url=github_user.get("avatar_url", ""),
-                is_verified=True
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        else:
-            # Update existing user
-            user.email = primary_email or github_user.get("email", user.email)
-            user.username = github_user["login"]
-            user.full_name = github_user.get("name", user.full_name)
-            user.avatar_url = github_user.get("avatar_url", user.avatar_url)
-            db.commit()
-            db.refresh(user)
-        
-        return user 
\ No newline at end of file
+        db.add(user)
+        await db.commit()
+    else:
+        # Update existing user
+        user.email = primary_email or github_user.get("email", user.email)
+        user.username = github_user["login"]
+        user.full_name = github_user.get("name", user.full_name)
+        user.avatar_url = github_user.get("avatar_url", user.avatar_url)
+        await db.commit()
+        invalidate_user(user.id)
+    
+    return user 
\ No newline at end of file
@@ -0,0 +1,123 @@
+import logging
+import math
+import os
+import time
+from typing import Optional
+
+import redis.asyncio as redis
+from cachetools import TLRUCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Shared cache: Redis when REDIS_URL is set, otherwise a per-process dict
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+
+# Fallback store: key -> (value, ttl). Bounded, as callers build keys
+# from request parameters; expired and least recently used entries go first
+LOCAL_CACHE_SIZE = 10_000
+_local_cache: TLRUCache = TLRUCache(
+    maxsize=LOCAL_CACHE_SIZE,
+    ttu=lambda _key, value, now: now + value[1],
+    timer=time.monotonic
+)
+# Fallback rate limit counters: key -> (count, expires_at), bounded the same way
+_local_counters: TLRUCache = TLRUCache(
+    maxsize=LOCAL_CACHE_SIZE,
+    ttu=lambda _key, value, _now: value[1],
+    timer=time.monotonic
+)
+# Fallback revocations: key -> ttl. Kept apart from the cache above and
+# unbounded, so a flood of cache entries can never evict a revocation;
+# entries only leave once they expire
+_local_revocations: TLRUCache = TLRUCache(
+    maxsize=math.inf,
+    ttu=lambda _key, ttl, now: now + ttl,
+    timer=time.monotonic
+)
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Get a cached value, treating an unreachable Redis as a miss"""
+    if redis_client is None:
+        cached = _local_cache.get(key)
+        return cached[0] if cached is not None else None
+    
+    try:
+        return await redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache get failed for {key}: {e}")
+        return None
+
+async def cache_set(key: str, value: bytes, ttl: int) -> None:
+    """Cache a value for ttl seconds"""
+    if redis_client is None:
+        _local_cache[key] = (value, ttl)
+        return
+    
+    try:
+        await redis_client.set(key, value, ex=ttl)
+    except redis.RedisError as e:
+        logger.warning(f"Cache set failed for {key}: {e}")
+
+async def cache_delete(*keys: str) -> None:
+    """Drop cached values after the data behind them changes"""
+    if redis_client is None:
+        for key in keys:
+            _local_cache.pop(key, None)
+        return
+    
+    try:
+        await redis_client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning(f"Cache delete failed for {keys}: {e}")
+
+async def cache_incr(key: str, ttl: int) -> int:
+    """Increment a counter that resets ttl seconds after its first hit"""
+    if redis_client is None:
+        count, expires_at = _local_counters.get(key, (0, time.monotonic() + ttl))
+        _local_counters[key] = (count + 1, expires_at)
+        return count + 1
+    
+    try:
+        # Create the key with its expiry and increment it in one MULTI, so
+        # a counter can never be left behind without a TTL
+        async with redis_client.pipeline(transaction=True) as pipe:
+            _, count = await pipe.set(key, 0, ex=ttl, nx=True).incr(key).execute()
+        return count
+    except redis.RedisError as e:
+        # Fail open: an unreachable Redis shouldn't block requests
+        logger.warning(f"Cache incr failed for {key}: {e}")
+        return 0
+
+async def store_revocation(key: str, ttl: int) -> None:
+    """Record a revocation that lasts ttl seconds and is never evicted early"""
+    if redis_client is None:
+        _local_revocations[key] = ttl
+        return
+    
+    try:
+        await redis_client.set(key, b"1", ex=ttl)
+    except redis.RedisError:
+        # The caller must not report success for a revocation that wasn't stored
+        logger.exception(f"Revocation store failed for {key}")
+        raise
+
+async def is_revoked(key: str) -> bool:
+    """Check a revocation, treating an unreachable Redis as revoked"""
+    if redis_client is None:
+        return key in _local_revocations
+    
+    try:
+        return await redis_client.exists(key) > 0
+    except redis.RedisError as e:
+        # Fail closed: a revoked token must not work again during an outage
+        logger.warning(f"Revocation check failed for {key}: {e}")
+        return True
+
+async def close_cache():
+    """Close the Redis connection pool"""
+    if redis_client is not None:
+        await redis_client.aclose()
\ No newline at end of file
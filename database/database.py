@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from urllib.parse import urlparse
 import os
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,40 +16,89 @@ if DATABASE_URL.startswith('postgres'):
     if not DATABASE_URL.startswith('postgresql://'):
         DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
-# Create SQLAlchemy engine lazily
+# Async drivers: asyncpg for PostgreSQL, aiosqlite for the SQLite fallback
+ASYNC_DATABASE_URL = (
+    DATABASE_URL
+    .replace('postgresql://', 'postgresql+asyncpg://', 1)
+    .replace('sqlite://', 'sqlite+aiosqlite://', 1)
+)
+
+# Defer engine creation until first use (for tests)
+LAZY_DB = os.getenv("LOGISCORE_LAZY_DB") == "1"
+
+# PgBouncer / Supabase transaction pooler ports
+POOLER_PORTS = {6432, 6543}
+
+def _uses_external_pool(database_url: str) -> bool:
+    """Whether connections go through a transaction-mode pooler"""
+    setting = os.getenv("DB_EXTERNAL_POOL")
+    if setting is not None:
+        return setting == "1"
+    return urlparse(database_url).port in POOLER_PORTS
+
+def _build_engine(database_url: str):
+    """Create the SQLAlchemy engine for the given URL"""
+    if database_url.startswith('postgres') and _uses_external_pool(database_url):
+        # The pooler multiplexes server connections, so don't hold our own,
+        # and avoid named prepared statements that would leak across clients
+        return create_async_engine(
+            database_url,
+            poolclass=NullPool,
+            connect_args={
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__"
+            },
+            query_cache_size=1200,
+            echo=False
+        )
+    if database_url.startswith('postgres'):
+        # PostgreSQL configuration; each pooled connection keeps its
+        # prepared statements so repeated queries skip parse and plan
+        statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "1024"))
+        return create_async_engine(
+            database_url,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            connect_args={
+                "statement_cache_size": statement_cache_size,
+                "prepared_statement_cache_size": statement_cache_size
+            },
+            query_cache_size=1200,
+            echo=False
+        )
+    # SQLite fallback for development
+    return create_async_engine(
+        database_url,
+        query_cache_size=1200,
+        echo=False
+    )
+
+engine = None if LAZY_DB else _build_engine(ASYNC_DATABASE_URL)
+# expire_on_commit=False so committed objects can still be read without
+# an implicit (and in async, disallowed) refresh
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def get_engine():
     """Get database engine, creating it if necessary"""
-    if not hasattr(get_engine, '_engine'):
-        if DATABASE_URL.startswith('postgres'):
-            # PostgreSQL configuration
-            get_engine._engine = create_engine(
-                DATABASE_URL,
-                pool_pre_ping=True,
-                pool_recycle=300,
-                echo=False
-            )
-        else:
-            # SQLite fallback for development
-            get_engine._engine = create_engine(
-                DATABASE_URL,
-                connect_args={"check_same_thread": False},
-                echo=False
-            )
-    return get_engine._engine
-
-# Create SessionLocal class
-def get_session_local():
-    """Get SessionLocal class"""
-    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    global engine
+    if engine is None:
+        engine = _build_engine(ASYNC_DATABASE_URL)
+        SessionLocal.configure(bind=engine)
+    return engine
 
 # Create Base class
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     """Dependency to get database session"""
-    SessionLocal = get_session_local()
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
@@ -0,0 +1,17 @@
+-- Migration: Index foreign key columns
+-- Run this in your Supabase SQL Editor
+
+-- PostgreSQL does not index foreign key columns automatically
+CREATE INDEX IF NOT EXISTS ix_branches_freight_forwarder_id ON branches(freight_forwarder_id);
+CREATE INDEX IF NOT EXISTS ix_reviews_user_id ON reviews(user_id);
+CREATE INDEX IF NOT EXISTS ix_reviews_freight_forwarder_id ON reviews(freight_forwarder_id);
+CREATE INDEX IF NOT EXISTS ix_reviews_branch_id ON reviews(branch_id);
+CREATE INDEX IF NOT EXISTS ix_review_category_scores_review_id ON review_category_scores(review_id);
+CREATE INDEX IF NOT EXISTS ix_user_sessions_user_id ON user_sessions(user_id);
+CREATE INDEX IF NOT EXISTS ix_disputes_review_id ON disputes(review_id);
+CREATE INDEX IF NOT EXISTS ix_disputes_reported_by ON disputes(reported_by);
+CREATE INDEX IF NOT EXISTS ix_ad_campaigns_freight_forwarder_id ON ad_campaigns(freight_forwarder_id);
+
+-- Latest reviews for a forwarder / branch
+CREATE INDEX IF NOT EXISTS ix_reviews_ff_created ON reviews(freight_forwarder_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_reviews_branch_created ON reviews(branch_id, created_at);
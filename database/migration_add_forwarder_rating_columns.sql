@@ -0,0 +1,44 @@
+-- Migration: Denormalized rating columns on freight_forwarders
+-- Run this in your Supabase SQL Editor
+
+-- Search reads the average rating and review count straight from the
+-- forwarder row instead of aggregating reviews on every request
+ALTER TABLE freight_forwarders
+ADD COLUMN IF NOT EXISTS average_rating DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS review_count INTEGER NOT NULL DEFAULT 0;
+
+-- Recompute the aggregates for one forwarder from its active reviews
+CREATE OR REPLACE FUNCTION refresh_forwarder_rating(ff_id UUID) RETURNS void AS $$
+    UPDATE freight_forwarders f
+    SET (average_rating, review_count) = (
+        SELECT avg(r.overall_rating), count(*)
+        FROM reviews r
+        WHERE r.freight_forwarder_id = ff_id AND r.is_active
+    )
+    WHERE f.id = ff_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION reviews_refresh_forwarder_rating() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_forwarder_rating(OLD.freight_forwarder_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.freight_forwarder_id IS DISTINCT FROM OLD.freight_forwarder_id) THEN
+        PERFORM refresh_forwarder_rating(NEW.freight_forwarder_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_reviews_forwarder_rating ON reviews;
+CREATE TRIGGER tr_reviews_forwarder_rating
+    AFTER INSERT OR DELETE OR UPDATE OF overall_rating, is_active, freight_forwarder_id ON reviews
+    FOR EACH ROW EXECUTE FUNCTION reviews_refresh_forwarder_rating();
+
+-- Backfill
+UPDATE freight_forwarders f
+SET (average_rating, review_count) = (
+    SELECT avg(r.overall_rating), count(*)
+    FROM reviews r
+    WHERE r.freight_forwarder_id = f.id AND r.is_active
+);
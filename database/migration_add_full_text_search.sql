@@ -0,0 +1,10 @@
+-- Migration: Full-text search on freight forwarder names
+-- Run this in your Supabase SQL Editor
+
+-- /api/search/freight-forwarders matches words (and word prefixes) with
+-- an inverted index instead of scanning names with ILIKE
+ALTER TABLE freight_forwarders
+ADD COLUMN IF NOT EXISTS search_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('simple', coalesce(name, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_freight_forwarders_search_tsv ON freight_forwarders USING gin (search_tsv);
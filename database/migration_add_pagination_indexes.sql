@@ -0,0 +1,8 @@
+-- Migration: Index list ordering keys for cursor pagination
+-- Run this in your Supabase SQL Editor
+
+-- List endpoints page through rows ordered by (created_at, id)
+CREATE INDEX IF NOT EXISTS ix_users_created_id ON users(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_freight_forwarders_created_id ON freight_forwarders(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_reviews_created_id ON reviews(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_disputes_created_id ON disputes(created_at, id);
@@ -0,0 +1,7 @@
+-- Migration: Index the search ordering for keyset pagination
+-- Run this in your Supabase SQL Editor
+
+-- /api/search/freight-forwarders orders by (coalesce(average_rating, -1), id)
+-- descending and seeks past the previous page's last row
+CREATE INDEX IF NOT EXISTS ix_freight_forwarders_rating_id
+ON freight_forwarders ((coalesce(average_rating, -1)) DESC, id DESC);
@@ -0,0 +1,66 @@
+-- Migration: Trigger-maintained dashboard counters
+-- Run this in your Supabase SQL Editor
+
+-- One row per dashboard metric, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS stats_summary (
+    metric VARCHAR(50) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
+
+-- Row counts: +1 on insert, -1 on delete (metric name in TG_ARGV[0])
+CREATE OR REPLACE FUNCTION bump_stat() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE stats_summary SET value = value + 1 WHERE metric = TG_ARGV[0];
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE stats_summary SET value = value - 1 WHERE metric = TG_ARGV[0];
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rows in a given status (metric in TG_ARGV[0], status in TG_ARGV[1])
+CREATE OR REPLACE FUNCTION bump_status_stat() RETURNS trigger AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status = TG_ARGV[1] THEN
+            delta := delta - 1;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status = TG_ARGV[1] THEN
+            delta := delta + 1;
+        END IF;
+    END IF;
+    IF delta <> 0 THEN
+        UPDATE stats_summary SET value = value + delta WHERE metric = TG_ARGV[0];
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_users_count ON users;
+CREATE TRIGGER tr_users_count AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION bump_stat('total_users');
+
+DROP TRIGGER IF EXISTS tr_freight_forwarders_count ON freight_forwarders;
+CREATE TRIGGER tr_freight_forwarders_count AFTER INSERT OR DELETE ON freight_forwarders
+    FOR EACH ROW EXECUTE FUNCTION bump_stat('total_companies');
+
+DROP TRIGGER IF EXISTS tr_reviews_count ON reviews;
+CREATE TRIGGER tr_reviews_count AFTER INSERT OR DELETE ON reviews
+    FOR EACH ROW EXECUTE FUNCTION bump_stat('total_reviews');
+
+DROP TRIGGER IF EXISTS tr_disputes_pending ON disputes;
+CREATE TRIGGER tr_disputes_pending AFTER INSERT OR DELETE OR UPDATE OF status ON disputes
+    FOR EACH ROW EXECUTE FUNCTION bump_status_stat('pending_disputes', 'open');
+
+-- Seed from the current tables; run in one transaction with the triggers
+INSERT INTO stats_summary (metric, value) VALUES
+    ('total_users', (SELECT count(*) FROM users)),
+    ('total_companies', (SELECT count(*) FROM freight_forwarders)),
+    ('total_reviews', (SELECT count(*) FROM reviews)),
+    ('pending_disputes', (SELECT count(*) FROM disputes WHERE status = 'open'))
+ON CONFLICT (metric) DO UPDATE SET value = EXCLUDED.value;
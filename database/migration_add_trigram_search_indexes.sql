@@ -0,0 +1,11 @@
+-- Migration: Trigram indexes for substring search
+-- Run this in your Supabase SQL Editor
+
+-- ILIKE '%q%' can't use a B-tree; pg_trgm GIN indexes serve it instead
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Forwarder list, search and suggestions filter on name
+CREATE INDEX IF NOT EXISTS ix_freight_forwarders_name_trgm ON freight_forwarders USING gin (name gin_trgm_ops);
+
+-- Admin user search matches email, username or full name
+CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin (email gin_trgm_ops, username gin_trgm_ops, full_name gin_trgm_ops);
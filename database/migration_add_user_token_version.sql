@@ -0,0 +1,7 @@
+-- Migration: Add token_version to users
+-- Run this in your Supabase SQL Editor
+
+-- Access tokens carry the user's token_version ("ver" claim); changing or
+-- resetting the password bumps it, which revokes every token issued
+-- before. Tokens without the claim count as version 0.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
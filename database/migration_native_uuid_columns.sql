@@ -0,0 +1,64 @@
+-- Migration: Store ids as native uuid instead of text
+-- Run this in your Supabase SQL Editor
+
+-- Databases created before the models used UUID columns may still hold
+-- ids as text/varchar (36+ bytes per value instead of 16, in every table
+-- and index). Convert primary and foreign keys in one pass; columns that
+-- are already uuid are left untouched, so this is safe to re-run.
+DO $$
+DECLARE
+    fk RECORD;
+    col RECORD;
+    readd TEXT[] := '{}';
+    stmt TEXT;
+BEGIN
+    CREATE TEMP TABLE uuid_columns (table_name TEXT, column_name TEXT) ON COMMIT DROP;
+    INSERT INTO uuid_columns
+    SELECT c.table_name, c.column_name
+    FROM information_schema.columns c
+    JOIN (VALUES
+        ('users', 'id'),
+        ('freight_forwarders', 'id'),
+        ('branches', 'id'), ('branches', 'freight_forwarder_id'),
+        ('reviews', 'id'), ('reviews', 'user_id'), ('reviews', 'freight_forwarder_id'), ('reviews', 'branch_id'),
+        ('review_category_scores', 'id'), ('review_category_scores', 'review_id'),
+        ('user_sessions', 'id'), ('user_sessions', 'user_id'),
+        ('disputes', 'id'), ('disputes', 'review_id'), ('disputes', 'reported_by'),
+        ('ad_campaigns', 'id'), ('ad_campaigns', 'freight_forwarder_id')
+    ) AS k(table_name, column_name)
+      ON k.table_name = c.table_name AND k.column_name = c.column_name
+    WHERE c.table_schema = 'public'
+      AND c.data_type IN ('text', 'character varying');
+    
+    IF NOT EXISTS (SELECT 1 FROM uuid_columns) THEN
+        RETURN;
+    END IF;
+    
+    -- Foreign keys can't span a text and a uuid column, so drop them while
+    -- both sides change type and recreate them afterwards
+    FOR fk IN
+        SELECT conrelid::regclass AS tbl, conname, pg_get_constraintdef(oid) AS def
+        FROM pg_constraint
+        WHERE contype = 'f'
+          AND (conrelid::regclass::text IN (SELECT table_name FROM uuid_columns)
+               OR confrelid::regclass::text IN (SELECT table_name FROM uuid_columns))
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.tbl, fk.conname);
+        readd := readd || format('ALTER TABLE %s ADD CONSTRAINT %I %s', fk.tbl, fk.conname, fk.def);
+    END LOOP;
+    
+    -- Text defaults can't be cast either; ids get gen_random_uuid() back
+    FOR col IN SELECT * FROM uuid_columns LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN %I DROP DEFAULT, ALTER COLUMN %I TYPE uuid USING %I::uuid',
+            col.table_name, col.column_name, col.column_name, col.column_name
+        );
+        IF col.column_name = 'id' THEN
+            EXECUTE format('ALTER TABLE %I ALTER COLUMN id SET DEFAULT gen_random_uuid()', col.table_name);
+        END IF;
+    END LOOP;
+    
+    FOREACH stmt IN ARRAY readd LOOP
+        EXECUTE stmt;
+    END LOOP;
+END $$;
@@ -0,0 +1,12 @@
+-- Migration: Partial index on pending password reset expiry
+-- Run this in your Supabase SQL Editor
+
+-- Only users with an outstanding reset token are indexed, so the index
+-- stays tiny and the sweep below never scans the users table
+CREATE INDEX IF NOT EXISTS ix_users_reset_token_expires ON users(reset_token_expires)
+WHERE reset_token IS NOT NULL;
+
+-- Expired tokens are cleared in one batch, e.g. with pg_cron:
+-- SELECT cron.schedule('purge-reset-tokens', '*/15 * * * *',
+--     $$UPDATE users SET reset_token = NULL, reset_token_expires = NULL
+--       WHERE reset_token IS NOT NULL AND reset_token_expires < now()$$);
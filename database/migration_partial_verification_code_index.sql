@@ -0,0 +1,9 @@
+-- Migration: Partial index on pending verification code expiry
+-- Run this in your Supabase SQL Editor
+
+-- Only rows with an outstanding code are indexed, so the index stays tiny
+CREATE INDEX IF NOT EXISTS ix_users_vcode_expires ON users(verification_code_expires)
+WHERE verification_code IS NOT NULL;
+
+-- Superseded by the partial index above
+DROP INDEX IF EXISTS idx_users_verification_code_expires;
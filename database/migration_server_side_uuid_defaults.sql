@@ -0,0 +1,14 @@
+-- Migration: Generate primary key UUIDs in the database
+-- Run this in your Supabase SQL Editor
+
+-- gen_random_uuid() is built in from PostgreSQL 13, pgcrypto provides it before that
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+ALTER TABLE users ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE freight_forwarders ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE branches ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE reviews ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE review_category_scores ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE user_sessions ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE disputes ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE ad_campaigns ALTER COLUMN id SET DEFAULT gen_random_uuid();
@@ -0,0 +1,23 @@
+-- Migration: Enforce unique freight forwarder names
+-- Run this in your Supabase SQL Editor
+
+-- create_company inserts with ON CONFLICT (name) DO NOTHING, which needs
+-- a unique index on name. Databases seeded by setup_database.py (which
+-- also relies on ON CONFLICT (name)) may already have one; add uq_ff_name
+-- only when no unique index covers name. Rename any existing duplicates
+-- first, e.g.:
+-- SELECT name, COUNT(*) FROM freight_forwarders GROUP BY name HAVING COUNT(*) > 1;
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'freight_forwarders'::regclass
+          AND i.indisunique
+          AND i.indnatts = 1
+          AND a.attname = 'name'
+    ) THEN
+        ALTER TABLE freight_forwarders ADD CONSTRAINT uq_ff_name UNIQUE (name);
+    END IF;
+END $$;
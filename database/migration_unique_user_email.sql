@@ -0,0 +1,21 @@
+-- Migration: Ensure users.email is unique
+-- Run this in your Supabase SQL Editor
+
+-- Signup inserts with ON CONFLICT (email) DO NOTHING instead of checking
+-- for an existing user first, which needs a unique index on email (it
+-- also serves the signin lookup). Tables created from the models already
+-- have users_email_key; add it only when no unique index covers email.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'users'::regclass
+          AND i.indisunique
+          AND i.indnatts = 1
+          AND a.attname = 'email'
+    ) THEN
+        ALTER TABLE users ADD CONSTRAINT users_email_key UNIQUE (email);
+    END IF;
+END $$;
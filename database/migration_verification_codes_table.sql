@@ -0,0 +1,32 @@
+-- Migration: Move email verification codes to their own table
+-- Run this in your Supabase SQL Editor
+
+-- Issuing and consuming a login code used to rewrite the user row twice.
+-- Pending codes now live in a narrow table keyed by email.
+CREATE TABLE IF NOT EXISTS verification_codes (
+    email VARCHAR(255) PRIMARY KEY,
+    code VARCHAR(6) NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_verification_codes_expires_at ON verification_codes(expires_at);
+
+-- Carry over codes that are still pending
+INSERT INTO verification_codes (email, code, expires_at)
+SELECT email, verification_code, verification_code_expires
+FROM users
+WHERE verification_code IS NOT NULL
+  AND verification_code_expires > now()
+ON CONFLICT (email) DO NOTHING;
+
+DROP INDEX IF EXISTS ix_users_vcode_expires;
+DROP INDEX IF EXISTS idx_users_verification_code;
+DROP INDEX IF EXISTS idx_users_verification_code_expires;
+
+ALTER TABLE users
+DROP COLUMN IF EXISTS verification_code,
+DROP COLUMN IF EXISTS verification_code_expires;
+
+-- Codes that are never verified are purged in one batch, e.g. with pg_cron:
+-- SELECT cron.schedule('purge-verification-codes', '*/15 * * * *',
+--     $$DELETE FROM verification_codes WHERE expires_at < now()$$);
@@ -1,13 +1,55 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Computed, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Uuid, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
+from sqlalchemy.sql.functions import FunctionElement
 from database.database import Base
-import uuid
+
+class gen_random_uuid(FunctionElement):
+    """Server-side UUID default, compiled per dialect"""
+    type = Uuid()
+    inherit_cache = True
+
+@compiles(gen_random_uuid)
+def _gen_random_uuid(element, compiler, **kw):
+    return "gen_random_uuid()"
+
+# SQLite (the local dev fallback) has no gen_random_uuid(); Uuid stores
+# 32 hex characters there, so random hex fills in
+@compiles(gen_random_uuid, "sqlite")
+def _gen_random_uuid_sqlite(element, compiler, **kw):
+    return "lower(hex(randomblob(16)))"
+
+class name_search_document(FunctionElement):
+    """Generated search document for FreightForwarder.search_tsv, compiled per dialect"""
+    inherit_cache = True
+
+@compiles(name_search_document)
+def _name_search_document(element, compiler, **kw):
+    return "to_tsvector('simple', coalesce(name, ''))"
+
+# SQLite has no full-text types; keep the column so create_all works there
+@compiles(name_search_document, "sqlite")
+def _name_search_document_sqlite(element, compiler, **kw):
+    return "lower(coalesce(name, ''))"
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Cursor pagination ordering key
+        Index("ix_users_created_id", "created_at", "id"),
+        # Outstanding password resets only, for sweeping expired tokens
+        Index(
+            "ix_users_reset_token_expires",
+            "reset_token_expires",
+            postgresql_where=text("reset_token IS NOT NULL")
+        ),
+        # Admin user search also uses ix_users_search_trgm, created by
+        # migration_add_trigram_search_indexes.sql as it needs pg_trgm
+    )
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
     github_id = Column(String(255), unique=True, nullable=True)
     email = Column(String(255), unique=True, nullable=False)
     username = Column(String(100), unique=True, nullable=True)
@@ -17,13 +59,13 @@ class User(Base):
     hashed_password = Column(String(255), nullable=True)  # For email/password auth
     reset_token = Column(String(255), nullable=True)  # For password reset
     reset_token_expires = Column(DateTime(timezone=True), nullable=True)  # For password reset
-    verification_code = Column(String(6), nullable=True)  # For email verification
-    verification_code_expires = Column(DateTime(timezone=True), nullable=True)  # For email verification
     user_type = Column(String(20), default='shipper')
     subscription_tier = Column(String(20), default='free')
     stripe_customer_id = Column(String(255), nullable=True)
     is_verified = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
+    # Embedded in access tokens; bumped on password change/reset to revoke them
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -31,14 +73,47 @@ class User(Base):
     reviews = relationship("Review", back_populates="user")
     sessions = relationship("UserSession", back_populates="user")
 
+class VerificationCode(Base):
+    __tablename__ = "verification_codes"
+    
+    # Pending email login codes, kept off the users table so issuing and
+    # consuming a code doesn't rewrite user rows
+    email = Column(String(255), primary_key=True)
+    code = Column(String(6), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
 class FreightForwarder(Base):
     __tablename__ = "freight_forwarders"
+    __table_args__ = (
+        # Cursor pagination ordering key
+        Index("ix_freight_forwarders_created_id", "created_at", "id"),
+        # Company names are unique; create_company relies on it for ON CONFLICT
+        UniqueConstraint("name", name="uq_ff_name"),
+        # Full-text search
+        Index("ix_freight_forwarders_search_tsv", "search_tsv", postgresql_using="gin"),
+        # Search keyset ordering (best rated first, unrated last)
+        Index(
+            "ix_freight_forwarders_rating_id",
+            text("coalesce(average_rating, -1) DESC"),
+            text("id DESC")
+        ),
+        # Name search also uses ix_freight_forwarders_name_trgm, created by
+        # migration_add_trigram_search_indexes.sql as it needs pg_trgm
+    )
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
     name = Column(String(255), nullable=False)
     website = Column(String(255), nullable=True)
     logo_url = Column(Text, nullable=True)
+    # Over active reviews, maintained by triggers (migration_add_forwarder_rating_columns.sql)
+    average_rating = Column(Float, nullable=True)
+    review_count = Column(Integer, nullable=False, server_default=text("0"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Generated from name; deferred so normal loads don't fetch it
+    search_tsv = deferred(Column(
+        TSVECTOR().with_variant(Text(), "sqlite"),
+        Computed(name_search_document(), persisted=True)
+    ))
     
     # Relationships
     branches = relationship("Branch", back_populates="freight_forwarder")
@@ -47,8 +122,8 @@ class FreightForwarder(Base):
 class Branch(Base):
     __tablename__ = "branches"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    freight_forwarder_id = Column(UUID(as_uuid=True), ForeignKey("freight_forwarders.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
+    freight_forwarder_id = Column(Uuid, ForeignKey("freight_forwarders.id"), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     location = Column(String(255), nullable=False)
     address = Column(Text, nullable=True)
@@ -63,11 +138,18 @@ class Branch(Base):
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # Latest reviews for a forwarder / branch
+        Index("ix_reviews_ff_created", "freight_forwarder_id", "created_at"),
+        Index("ix_reviews_branch_created", "branch_id", "created_at"),
+        # Cursor pagination ordering key
+        Index("ix_reviews_created_id", "created_at", "id"),
+    )
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    freight_forwarder_id = Column(UUID(as_uuid=True), ForeignKey("freight_forwarders.id"), nullable=False)
-    branch_id = Column(UUID(as_uuid=True), ForeignKey("branches.id"), nullable=True)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False, index=True)
+    freight_forwarder_id = Column(Uuid, ForeignKey("freight_forwarders.id"), nullable=False, index=True)
+    branch_id = Column(Uuid, ForeignKey("branches.id"), nullable=True, index=True)
     overall_rating = Column(Float, nullable=False)
     review_text = Column(Text, nullable=True)
     is_anonymous = Column(Boolean, default=False)
@@ -79,13 +161,14 @@ class Review(Base):
     # Relationships
     user = relationship("User", back_populates="reviews")
     freight_forwarder = relationship("FreightForwarder", back_populates="reviews")
+    branch = relationship("Branch")
     category_scores = relationship("ReviewCategoryScore", back_populates="review")
 
 class ReviewCategoryScore(Base):
     __tablename__ = "review_category_scores"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    review_id = Column(UUID(as_uuid=True), ForeignKey("reviews.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
+    review_id = Column(Uuid, ForeignKey("reviews.id"), nullable=False, index=True)
     category = Column(String(100), nullable=False)
     score = Column(Float, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -96,8 +179,8 @@ class ReviewCategoryScore(Base):
 class UserSession(Base):
     __tablename__ = "user_sessions"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False, index=True)
     session_token = Column(String(255), unique=True, nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
     is_active = Column(Boolean, default=True)
@@ -108,10 +191,14 @@ class UserSession(Base):
 
 class Dispute(Base):
     __tablename__ = "disputes"
+    __table_args__ = (
+        # Cursor pagination ordering key
+        Index("ix_disputes_created_id", "created_at", "id"),
+    )
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    review_id = Column(UUID(as_uuid=True), ForeignKey("reviews.id"), nullable=False)
-    reported_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
+    review_id = Column(Uuid, ForeignKey("reviews.id"), nullable=False, index=True)
+    reported_by = Column(Uuid, ForeignKey("users.id"), nullable=False, index=True)
     reason = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     status = Column(String(50), default='pending')
@@ -119,12 +206,15 @@ class Dispute(Base):
     resolved_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Relationships
+    review = relationship("Review")
 
 class AdCampaign(Base):
     __tablename__ = "ad_campaigns"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    freight_forwarder_id = Column(UUID(as_uuid=True), ForeignKey("freight_forwarders.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, server_default=gen_random_uuid())
+    freight_forwarder_id = Column(Uuid, ForeignKey("freight_forwarders.id"), nullable=False, index=True)
     campaign_name = Column(String(255), nullable=False)
     ad_type = Column(String(50), nullable=False)  # banner, spotlight, featured
     start_date = Column(DateTime(timezone=True), nullable=False)
@@ -133,4 +223,11 @@ class AdCampaign(Base):
     spent = Column(Float, default=0.0)
     status = Column(String(50), default='active')
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StatsSummary(Base):
+    __tablename__ = "stats_summary"
+    
+    # Maintained by triggers, see migration_add_stats_summary.sql
+    metric = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
\ No newline at end of file
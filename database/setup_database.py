@@ -5,12 +5,13 @@ This script helps set up the Supabase database and populate it with initial data
 """
 
 import os
+import io
 import csv
 import uuid
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -64,6 +65,10 @@ class DatabaseSetup:
         try:
             csv_file = 'assets/LogiScore_table_freight_forwarders_data.csv'
             
+            # Cleaned rows as CSV for COPY (empty fields load as NULL)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            
             with open(csv_file, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
                 
@@ -76,19 +81,30 @@ class DatabaseSetup:
                     if not name:
                         continue
                     
-                    # Insert freight forwarder
-                    self.cursor.execute("""
-                        INSERT INTO freight_forwarders (id, name, website, logo_url, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (name) DO NOTHING
-                    """, (
+                    writer.writerow([
                         str(uuid.uuid4()),
                         name,
                         website if website else None,
-                        logo_url if logo_url else None,
-                        datetime.utcnow(),
-                        datetime.utcnow()
-                    ))
+                        logo_url if logo_url else None
+                    ])
+            
+            buffer.seek(0)
+            
+            # COPY into a staging table, then insert skipping existing names
+            self.cursor.execute("""
+                CREATE TEMP TABLE freight_forwarders_import
+                (LIKE freight_forwarders INCLUDING DEFAULTS) ON COMMIT DROP
+            """)
+            self.cursor.copy_expert(
+                "COPY freight_forwarders_import (id, name, website, logo_url) FROM STDIN WITH CSV",
+                buffer
+            )
+            self.cursor.execute("""
+                INSERT INTO freight_forwarders (id, name, website, logo_url, created_at, updated_at)
+                SELECT id, name, website, logo_url, now(), now()
+                FROM freight_forwarders_import
+                ON CONFLICT (name) DO NOTHING
+            """)
             
             self.conn.commit()
             print("✅ Freight forwarders loaded successfully")
@@ -136,23 +152,28 @@ class DatabaseSetup:
                 }
             ]
             
-            for forwarder in forwarders:
-                for branch_data in sample_branches:
-                    self.cursor.execute("""
-                        INSERT INTO branches (id, freight_forwarder_id, name, country, city, address, contact_email, contact_phone, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        str(uuid.uuid4()),
-                        forwarder['id'],
-                        f"{forwarder['name']} - {branch_data['name']}",
-                        branch_data['country'],
-                        branch_data['city'],
-                        branch_data['address'],
-                        branch_data['contact_email'],
-                        branch_data['contact_phone'],
-                        datetime.utcnow(),
-                        datetime.utcnow()
-                    ))
+            now = datetime.utcnow()
+            rows = [
+                (
+                    str(uuid.uuid4()),
+                    forwarder['id'],
+                    f"{forwarder['name']} - {branch_data['name']}",
+                    branch_data['country'],
+                    branch_data['city'],
+                    branch_data['address'],
+                    branch_data['contact_email'],
+                    branch_data['contact_phone'],
+                    now,
+                    now
+                )
+                for forwarder in forwarders
+                for branch_data in sample_branches
+            ]
+            
+            execute_values(self.cursor, """
+                INSERT INTO branches (id, freight_forwarder_id, name, country, city, address, contact_email, contact_phone, created_at, updated_at)
+                VALUES %s
+            """, rows)
             
             self.conn.commit()
             print("✅ Sample branches created successfully")
@@ -246,30 +267,33 @@ class DatabaseSetup:
                 }
             ]
             
-            for branch in branches:
-                for review_data in sample_reviews:
-                    self.cursor.execute("""
-                        INSERT INTO reviews (id, user_id, branch_id, freight_forwarder_id, overall_rating, 
-                        responsiveness_rating, documentation_rating, communication_rating, reliability_rating, 
-                        cost_effectiveness_rating, review_text, is_anonymous, is_verified, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        str(uuid.uuid4()),
-                        user['id'],
-                        branch['id'],
-                        branch['freight_forwarder_id'],
-                        review_data['overall_rating'],
-                        review_data['responsiveness_rating'],
-                        review_data['documentation_rating'],
-                        review_data['communication_rating'],
-                        review_data['reliability_rating'],
-                        review_data['cost_effectiveness_rating'],
-                        review_data['review_text'],
-                        review_data['is_anonymous'],
-                        review_data['is_verified'],
-                        datetime.utcnow(),
-                        datetime.utcnow()
-                    ))
+            # created_at / updated_at come from the column server defaults
+            rows = [
+                (
+                    str(uuid.uuid4()),
+                    user['id'],
+                    branch['id'],
+                    branch['freight_forwarder_id'],
+                    review_data['overall_rating'],
+                    review_data['responsiveness_rating'],
+                    review_data['documentation_rating'],
+                    review_data['communication_rating'],
+                    review_data['reliability_rating'],
+                    review_data['cost_effectiveness_rating'],
+                    review_data['review_text'],
+                    review_data['is_anonymous'],
+                    review_data['is_verified']
+                )
+                for branch in branches
+                for review_data in sample_reviews
+            ]
+            
+            execute_values(self.cursor, """
+                INSERT INTO reviews (id, user_id, branch_id, freight_forwarder_id, overall_rating, 
+                responsiveness_rating, documentation_rating, communication_rating, reliability_rating, 
+                cost_effectiveness_rating, review_text, is_anonymous, is_verified)
+                VALUES %s
+            """, rows)
             
             self.conn.commit()
             print("✅ Sample reviews created successfully")
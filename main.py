@@ -1,19 +1,23 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import text
 import stripe
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from typing import Optional
 import logging
+import time
 
 # Import our modules
-from database.database import get_db, get_engine
+from database.database import SessionLocal, get_engine
 from database.models import Base
-from auth.auth import get_current_user, create_access_token
+from database.cache import close_cache
+from auth.auth import get_current_user, create_access_token, close_github_client, JWKS
 from routes import users, freight_forwarders, reviews, search, admin, auth
+from routes.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
 
 # Load environment variables
 load_dotenv()
@@ -26,7 +30,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="LogiScore API",
     description="Freight forwarder review and rating platform API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS configuration - Allow all origins temporarily
@@ -35,8 +40,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-    expose_headers=["*"],
+    # Explicit lists let Starlette build the preflight response once
+    # instead of echoing the requested headers on every OPTIONS
+    allow_headers=["Authorization", "Content-Type"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER],
+    # Browsers cache the preflight for a day (Chrome caps it at 2 hours)
+    max_age=86400,
 )
 
 # Security
@@ -46,12 +55,20 @@ security = HTTPBearer()
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
 # Create database tables (only if database is available)
-try:
-    engine = get_engine()
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.warning(f"Could not create database tables: {e}")
+@app.on_event("startup")
+async def create_tables():
+    try:
+        engine = get_engine()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        logger.info("Database tables created successfully")
+    except Exception as e:
+        logger.warning(f"Could not create database tables: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    await close_github_client()
+    await close_cache()
 
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
@@ -70,18 +87,26 @@ async def root():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+# Probes hit /health every few seconds; re-check the database at most this often
+HEALTH_CHECK_INTERVAL = 5
+_db_last_ok = 0.0
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
-    try:
-        # Test database connection
-        db = next(get_db())
-        from sqlalchemy import text
-        db.execute(text("SELECT 1"))
+    global _db_last_ok
+    if time.monotonic() - _db_last_ok < HEALTH_CHECK_INTERVAL:
         db_status = "healthy"
-    except Exception as e:
-        logger.error(f"Database health check failed: {e}")
-        db_status = "unhealthy"
+    else:
+        try:
+            # Test database connection
+            async with SessionLocal() as db:
+                await db.execute(text("SELECT 1"))
+            db_status = "healthy"
+            _db_last_ok = time.monotonic()
+        except Exception as e:
+            logger.error(f"Database health check failed: {e}")
+            db_status = "unhealthy"
     
     return {
         "status": "healthy" if db_status == "healthy" else "unhealthy",
@@ -89,6 +114,11 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    """Public keys for verifying access tokens"""
+    return JWKS
+
 @app.get("/api/test")
 async def test_endpoint():
     """Test endpoint for development"""
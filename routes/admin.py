@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select, func, and_, false
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from datetime import datetime, timedelta
-import uuid
+import logging
 
-from database.database import get_db
-from database.models import User, FreightForwarder, Review, Dispute, Branch
-from auth.auth import get_current_user
+from database.database import get_db, get_engine
+from database.cache import cache_get, cache_set, cache_delete
+from database.models import User, FreightForwarder, Review, Dispute, Branch, StatsSummary
+from auth.auth import get_current_user, invalidate_user, CurrentUser
+from routes.pagination import paginate, page
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 # Pydantic models for admin responses
 class DashboardStats(BaseModel):
     total_users: int
@@ -31,33 +37,30 @@ class AdminUser(BaseModel):
     subscription_tier: str
     is_verified: bool
     is_active: bool
-    created_at: str
+    created_at: Optional[datetime]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AdminReview(BaseModel):
     id: str
     freight_forwarder_name: str
     branch_name: Optional[str]
     reviewer_name: str
-    rating: int
+    rating: float
     comment: Optional[str]
     status: str
-    created_at: str
+    created_at: Optional[datetime]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AdminDispute(BaseModel):
     id: str
     freight_forwarder_name: str
     issue: str
     status: str
-    created_at: str
+    created_at: Optional[datetime]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AdminCompany(BaseModel):
     id: str
@@ -68,8 +71,7 @@ class AdminCompany(BaseModel):
     reviews_count: int
     status: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class SubscriptionUpdate(BaseModel):
     user_id: str
@@ -84,8 +86,19 @@ class CompanyCreate(BaseModel):
     description: Optional[str] = None
     headquarters_country: Optional[str] = None
 
+# Dashboard stats are cached briefly; admin writes that change them drop the entry
+DASHBOARD_STATS_KEY = "admin:dashboard:stats"
+DASHBOARD_STATS_TTL = 30
+
+def _summary_or_count(metric: str, count_query):
+    """Trigger-maintained counter, falling back to a live count when untracked"""
+    return func.coalesce(
+        select(StatsSummary.value).where(StatsSummary.metric == metric).scalar_subquery(),
+        count_query.scalar_subquery()
+    ).label(metric)
+
 # Helper function to check if user is admin
-async def get_admin_user(current_user: User = Depends(get_current_user)):
+async def get_admin_user(current_user: CurrentUser = Depends(get_current_user)):
     if current_user.user_type != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -95,68 +108,83 @@ async def get_admin_user(current_user: User = Depends(get_current_user)):
 
 @router.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
     try:
-        # Count total users
-        total_users = db.query(User).count()
-        
-        # Count total companies
-        total_companies = db.query(FreightForwarder).count()
-        
-        # Count total reviews
-        total_reviews = db.query(Review).count()
-        
-        # Count pending disputes
-        pending_disputes = db.query(Dispute).filter(Dispute.status == "open").count()
-        
-        # Count pending reviews (reviews that need moderation)
-        pending_reviews = db.query(Review).filter(Review.status == "pending").count()
+        cached = await cache_get(DASHBOARD_STATS_KEY)
+        if cached:
+            return DashboardStats.model_validate_json(cached)
+        
+        # All counts in one statement; tracked metrics are single-row lookups
+        counts = (await db.execute(select(
+            _summary_or_count("total_users", select(func.count()).select_from(User)),
+            _summary_or_count("total_companies", select(func.count()).select_from(FreightForwarder)),
+            _summary_or_count("total_reviews", select(func.count()).select_from(Review)),
+            _summary_or_count(
+                "pending_disputes",
+                select(func.count()).select_from(Dispute).where(Dispute.status == "open")
+            )
+        ))).one()
         
         # Calculate revenue (mock calculation for now)
         # In a real app, this would come from subscription payments
         total_revenue = 45600.0  # Mock value
         
-        return DashboardStats(
-            total_users=total_users,
-            total_companies=total_companies,
-            total_reviews=total_reviews,
-            pending_disputes=pending_disputes,
-            pending_reviews=pending_reviews,
+        stats = DashboardStats(
+            total_users=counts.total_users,
+            total_companies=counts.total_companies,
+            total_reviews=counts.total_reviews,
+            pending_disputes=counts.pending_disputes,
+            # Reviews have no moderation status yet, so none are pending
+            pending_reviews=0,
             total_revenue=total_revenue
         )
-    except Exception as e:
+        await cache_set(DASHBOARD_STATS_KEY, stats.model_dump_json().encode(), DASHBOARD_STATS_TTL)
+        return stats
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to get dashboard stats")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get dashboard stats: {str(e)}"
+            detail="Failed to get dashboard stats"
         )
 
+@router.get("/dashboard/pool")
+async def get_pool_status(admin_user: CurrentUser = Depends(get_admin_user)):
+    """Database pool usage, to spot exhaustion (kept off the public /health)"""
+    # Checked-in / checked-out / overflow connections
+    return {"pool": get_engine().pool.status()}
+
 @router.get("/users", response_model=List[AdminUser])
 async def get_users(
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db),
     search: Optional[str] = None,
     user_type: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
     """Get all users with filtering and pagination"""
     try:
-        query = db.query(User)
+        query = select(User)
         
         if search:
-            query = query.filter(
+            query = query.where(
                 User.email.contains(search) | 
                 User.username.contains(search) |
                 User.full_name.contains(search)
             )
         
         if user_type:
-            query = query.filter(User.user_type == user_type)
+            query = query.where(User.user_type == user_type)
         
-        users = query.offset(skip).limit(limit).all()
+        result = await db.execute(paginate(query, User, cursor, skip, limit))
+        users = page(result.scalars().all(), limit, response)
         
         return [
             AdminUser(
@@ -169,26 +197,30 @@ async def get_users(
                 subscription_tier=user.subscription_tier,
                 is_verified=user.is_verified,
                 is_active=user.is_active,
-                created_at=user.created_at.isoformat() if user.created_at else None
+                created_at=user.created_at
             )
             for user in users
         ]
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to get users")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get users: {str(e)}"
+            detail="Failed to get users"
         )
 
 @router.put("/users/{user_id}/subscription")
 async def update_user_subscription(
     user_id: str,
     subscription_update: SubscriptionUpdate,
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user subscription"""
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -201,32 +233,55 @@ async def update_user_subscription(
         # In a real app, you would also update subscription details in a separate table
         # For now, we'll just update the tier
         
-        db.commit()
+        await db.commit()
+        invalidate_user(user.id)
         
         return {"message": "Subscription updated successfully"}
-    except Exception as e:
-        db.rollback()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to update subscription")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update subscription: {str(e)}"
+            detail="Failed to update subscription"
         )
 
+# Moderation status is stored as Review.is_active: rejected reviews are hidden
+REVIEW_STATUSES = {"approved": True, "rejected": False}
+
+def _review_status(review: Review) -> str:
+    return "approved" if review.is_active else "rejected"
+
 @router.get("/reviews", response_model=List[AdminReview])
 async def get_reviews(
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db),
     status_filter: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
     """Get reviews for admin moderation"""
     try:
-        query = db.query(Review).join(FreightForwarder)
+        # Async sessions can't lazy load: join the many-to-one rows up front
+        # and fail loudly on anything else
+        query = select(Review).options(
+            joinedload(Review.freight_forwarder),
+            joinedload(Review.branch),
+            joinedload(Review.user),
+            raiseload("*")
+        )
         
         if status_filter:
-            query = query.filter(Review.status == status_filter)
+            # Unknown statuses (e.g. "pending") match nothing
+            is_active = REVIEW_STATUSES.get(status_filter)
+            query = query.where(Review.is_active == is_active if is_active is not None else false())
         
-        reviews = query.offset(skip).limit(limit).all()
+        result = await db.execute(paginate(query, Review, cursor, skip, limit))
+        reviews = page(result.scalars().all(), limit, response)
         
         return [
             AdminReview(
@@ -234,113 +289,141 @@ async def get_reviews(
                 freight_forwarder_name=review.freight_forwarder.name,
                 branch_name=review.branch.name if review.branch else None,
                 reviewer_name=review.user.username or "Anonymous",
-                rating=review.rating,
-                comment=review.comment,
-                status=review.status,
-                created_at=review.created_at.isoformat() if review.created_at else None
+                rating=review.overall_rating,
+                comment=review.review_text,
+                status=_review_status(review),
+                created_at=review.created_at
             )
             for review in reviews
         ]
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to get reviews")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get reviews: {str(e)}"
+            detail="Failed to get reviews"
         )
 
 @router.put("/reviews/{review_id}/approve")
 async def approve_review(
     review_id: str,
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Approve a review"""
     try:
-        review = db.query(Review).filter(Review.id == review_id).first()
+        result = await db.execute(select(Review).where(Review.id == review_id))
+        review = result.scalar_one_or_none()
         if not review:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Review not found"
             )
         
-        review.status = "approved"
-        db.commit()
+        review.is_active = True
+        await db.commit()
+        # The rating trigger changes the forwarder's cached average_rating/review_count
+        await cache_delete(DASHBOARD_STATS_KEY, f"ff:{review.freight_forwarder_id}")
         
         return {"message": "Review approved successfully"}
-    except Exception as e:
-        db.rollback()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to approve review")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to approve review: {str(e)}"
+            detail="Failed to approve review"
         )
 
 @router.put("/reviews/{review_id}/reject")
 async def reject_review(
     review_id: str,
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Reject a review"""
     try:
-        review = db.query(Review).filter(Review.id == review_id).first()
+        result = await db.execute(select(Review).where(Review.id == review_id))
+        review = result.scalar_one_or_none()
         if not review:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Review not found"
             )
         
-        review.status = "rejected"
-        db.commit()
+        review.is_active = False
+        await db.commit()
+        # The rating trigger changes the forwarder's cached average_rating/review_count
+        await cache_delete(DASHBOARD_STATS_KEY, f"ff:{review.freight_forwarder_id}")
         
         return {"message": "Review rejected successfully"}
-    except Exception as e:
-        db.rollback()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to reject review")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to reject review: {str(e)}"
+            detail="Failed to reject review"
         )
 
 @router.get("/disputes", response_model=List[AdminDispute])
 async def get_disputes(
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db),
     status_filter: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
     """Get disputes for admin resolution"""
     try:
-        query = db.query(Dispute).join(FreightForwarder)
+        # Disputes reach their forwarder through the disputed review
+        query = select(Dispute).options(
+            joinedload(Dispute.review).joinedload(Review.freight_forwarder),
+            raiseload("*")
+        )
         
         if status_filter:
-            query = query.filter(Dispute.status == status_filter)
+            query = query.where(Dispute.status == status_filter)
         
-        disputes = query.offset(skip).limit(limit).all()
+        result = await db.execute(paginate(query, Dispute, cursor, skip, limit))
+        disputes = page(result.scalars().all(), limit, response)
         
         return [
             AdminDispute(
                 id=str(dispute.id),
-                freight_forwarder_name=dispute.freight_forwarder.name,
-                issue=dispute.issue,
+                freight_forwarder_name=dispute.review.freight_forwarder.name,
+                issue=dispute.reason,
                 status=dispute.status,
-                created_at=dispute.created_at.isoformat() if dispute.created_at else None
+                created_at=dispute.created_at
             )
             for dispute in disputes
         ]
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to get disputes")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get disputes: {str(e)}"
+            detail="Failed to get disputes"
         )
 
 @router.put("/disputes/{dispute_id}/resolve")
 async def resolve_dispute(
     dispute_id: str,
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Resolve a dispute"""
     try:
-        dispute = db.query(Dispute).filter(Dispute.id == dispute_id).first()
+        result = await db.execute(select(Dispute).where(Dispute.id == dispute_id))
+        dispute = result.scalar_one_or_none()
         if not dispute:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -348,89 +431,103 @@ async def resolve_dispute(
             )
         
         dispute.status = "resolved"
-        db.commit()
+        await db.commit()
+        await cache_delete(DASHBOARD_STATS_KEY)
         
         return {"message": "Dispute resolved successfully"}
-    except Exception as e:
-        db.rollback()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to resolve dispute")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to resolve dispute: {str(e)}"
+            detail="Failed to resolve dispute"
         )
 
 @router.get("/companies", response_model=List[AdminCompany])
 async def get_companies(
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db),
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
     """Get all companies with stats"""
     try:
-        query = db.query(FreightForwarder)
+        # Branch and review counts as correlated subqueries, one round trip
+        branches_count = (
+            select(func.count()).select_from(Branch)
+            .where(Branch.freight_forwarder_id == FreightForwarder.id)
+            .scalar_subquery()
+        )
+        reviews_count = (
+            select(func.count()).select_from(Review)
+            .where(Review.freight_forwarder_id == FreightForwarder.id)
+            .scalar_subquery()
+        )
+        query = select(
+            FreightForwarder,
+            branches_count.label("branches_count"),
+            reviews_count.label("reviews_count")
+        )
         
         if search:
-            query = query.filter(FreightForwarder.name.contains(search))
+            query = query.where(FreightForwarder.name.contains(search))
         
-        companies = query.offset(skip).limit(limit).all()
+        result = await db.execute(paginate(query, FreightForwarder, cursor, skip, limit))
+        rows = page(result.all(), limit, response, key=lambda row: row.FreightForwarder)
         
-        result = []
-        for company in companies:
-            # Count branches
-            branches_count = db.query(Branch).filter(Branch.freight_forwarder_id == company.id).count()
-            
-            # Count reviews
-            reviews_count = db.query(Review).filter(Review.freight_forwarder_id == company.id).count()
-            
-            result.append(AdminCompany(
+        return [
+            AdminCompany(
                 id=str(company.id),
                 name=company.name,
                 website=company.website,
                 logo_url=company.logo_url,
                 branches_count=branches_count,
                 reviews_count=reviews_count,
-                status="active" if company.is_active else "inactive"
-            ))
-        
-        return result
-    except Exception as e:
+                # Companies can't be deactivated yet
+                status="active"
+            )
+            for company, branches_count, reviews_count in rows
+        ]
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to get companies")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get companies: {str(e)}"
+            detail="Failed to get companies"
         )
 
 @router.post("/companies", response_model=AdminCompany)
 async def create_company(
     company_data: CompanyCreate,
-    admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    admin_user: CurrentUser = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new company"""
     try:
-        # Check if company already exists
-        existing_company = db.query(FreightForwarder).filter(
-            FreightForwarder.name == company_data.name
-        ).first()
+        # Single atomic insert; the uq_ff_name constraint rejects duplicates
+        result = await db.execute(
+            pg_insert(FreightForwarder)
+            .values(name=company_data.name, website=company_data.website)
+            .on_conflict_do_nothing(index_elements=[FreightForwarder.name])
+            .returning(FreightForwarder)
+        )
+        new_company = result.scalar_one_or_none()
         
-        if existing_company:
+        if not new_company:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Company with this name already exists"
             )
         
-        new_company = FreightForwarder(
-            id=str(uuid.uuid4()),
-            name=company_data.name,
-            website=company_data.website,
-            description=company_data.description,
-            headquarters_country=company_data.headquarters_country,
-            is_active=True
-        )
-        
-        db.add(new_company)
-        db.commit()
-        db.refresh(new_company)
+        await db.commit()
+        await cache_delete(DASHBOARD_STATS_KEY)
         
         return AdminCompany(
             id=str(new_company.id),
@@ -441,9 +538,13 @@ async def create_company(
             reviews_count=0,
             status="active"
         )
-    except Exception as e:
-        db.rollback()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to create company")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create company: {str(e)}"
+            detail="Failed to create company"
         ) 
\ No newline at end of file
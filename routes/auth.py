@@ -1,22 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime, timedelta
-import uuid
-import random
-import string
+from datetime import datetime, timedelta, timezone
+import logging
+import secrets
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 
 from database.database import get_db
-from database.models import User
-from auth.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from database.models import User, VerificationCode
+from auth.auth import create_access_token, invalidate_user, check_rate_limit, client_ip, ACCESS_TOKEN_EXPIRES, USER_BY_EMAIL
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 class EmailAuthRequest(BaseModel):
     email: str
 
@@ -40,9 +43,14 @@ SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@logiscore.com")
 
+# send-code limits per window: each allowed call costs a DB write and an email
+SEND_CODE_WINDOW = 60  # seconds
+SEND_CODE_LIMIT_PER_EMAIL = 5
+SEND_CODE_LIMIT_PER_IP = 100
+
 def generate_verification_code() -> str:
     """Generate a 6-digit verification code"""
-    return ''.join(random.choices(string.digits, k=6))
+    return f"{secrets.randbelow(1_000_000):06d}"
 
 def send_verification_email(email: str, code: str, expires_in: int) -> bool:
     """Send verification code email"""
@@ -89,64 +97,68 @@ def send_verification_email(email: str, code: str, expires_in: int) -> bool:
 @router.post("/send-code", response_model=EmailAuthResponse)
 async def send_verification_code(
     request: EmailAuthRequest,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
 ):
     """Send verification code to user's email"""
+    email = request.email.lower().strip()
+    
+    # Throttle before any DB or SMTP work
+    await check_rate_limit(f"rl:sendcode:ip:{client_ip(http_request)}", SEND_CODE_LIMIT_PER_IP, SEND_CODE_WINDOW)
+    await check_rate_limit(f"rl:sendcode:email:{email}", SEND_CODE_LIMIT_PER_EMAIL, SEND_CODE_WINDOW)
+    
     try:
-        email = request.email.lower().strip()
-        
         # Check if user exists
-        user = db.query(User).filter(User.email == email).first()
+        result = await db.execute(USER_BY_EMAIL, {"email": email})
+        user = result.scalar_one_or_none()
         
         # Generate verification code
         code = generate_verification_code()
         expires_in = 10  # 10 minutes
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=expires_in)
         
-        # Store code in user record (or create user if doesn't exist)
-        if user:
-            # Update existing user
-            user.verification_code = code
-            user.verification_code_expires = datetime.utcnow() + timedelta(minutes=expires_in)
-        else:
-            # Create new user
+        # Create user if doesn't exist
+        if not user:
             user = User(
-                id=str(uuid.uuid4()),
                 email=email,
                 username=email.split('@')[0],  # Use email prefix as username
                 user_type="shipper",  # Default user type
                 subscription_tier="free",
                 is_verified=False,
-                is_active=True,
-                verification_code=code,
-                verification_code_expires=datetime.utcnow() + timedelta(minutes=expires_in)
+                is_active=True
             )
             db.add(user)
         
-        db.commit()
+        # Store (or replace) the pending code for this email
+        stmt = pg_insert(VerificationCode).values(email=email, code=code, expires_at=expires_at)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[VerificationCode.email],
+            set_={"code": stmt.excluded.code, "expires_at": stmt.excluded.expires_at}
+        ))
+        
+        await db.commit()
+        
+        # Send verification email after the response; the blocking SMTP
+        # exchange runs in the threadpool, failures are logged there
+        background_tasks.add_task(send_verification_email, email, code, expires_in)
+        return EmailAuthResponse(
+            message="Verification code sent to your email",
+            expires_in=expires_in
+        )
         
-        # Send verification email
-        if send_verification_email(email, code, expires_in):
-            return EmailAuthResponse(
-                message="Verification code sent to your email",
-                expires_in=expires_in
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send verification email"
-            )
-            
-    except Exception as e:
-        db.rollback()
+    except Exception:
+        logger.exception("Send verification code error")
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send verification code: {str(e)}"
+            detail="Failed to send verification code"
         )
 
 @router.post("/verify-code", response_model=CodeVerificationResponse)
 async def verify_code(
     request: CodeVerificationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Verify the code and authenticate user"""
     try:
@@ -154,34 +166,44 @@ async def verify_code(
         code = request.code.strip()
         
         # Find user by email
-        user = db.query(User).filter(User.email == email).first()
+        result = await db.execute(USER_BY_EMAIL, {"email": email})
+        user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        # Check if code is valid and not expired
-        if not user.verification_code or user.verification_code != code:
+        # Consume the code; a wrong code leaves the pending one in place
+        result = await db.execute(
+            delete(VerificationCode)
+            .where(VerificationCode.email == email, VerificationCode.code == code)
+            .returning(VerificationCode.expires_at)
+        )
+        expires_at = result.scalar_one_or_none()
+        if not expires_at:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid verification code"
             )
         
-        if not user.verification_code_expires or user.verification_code_expires < datetime.utcnow():
+        if expires_at < datetime.now(timezone.utc):
+            await db.commit()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Verification code has expired"
             )
         
-        # Clear verification code
-        user.verification_code = None
-        user.verification_code_expires = None
-        user.is_verified = True
-        db.commit()
+        # Only dirty the user row the first time
+        if not user.is_verified:
+            user.is_verified = True
+        await db.commit()
+        invalidate_user(user.id)
         
         # Generate access token
-        access_token = create_access_token(data={"sub": str(user.id)})
+        access_token = create_access_token(
+            data={"sub": str(user.id), "ver": user.token_version}, expires_delta=ACCESS_TOKEN_EXPIRES
+        )
         
         # Return user data
         user_data = {
@@ -205,9 +227,10 @@ async def verify_code(
         
     except HTTPException:
         raise
-    except Exception as e:
-        db.rollback()
+    except Exception:
+        logger.exception("Verify code error")
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to verify code: {str(e)}"
+            detail="Failed to verify code"
         ) 
\ No newline at end of file
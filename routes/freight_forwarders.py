@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from database.database import get_db
+from database.cache import cache_get, cache_set
 from database.models import FreightForwarder, Branch
+from routes.pagination import paginate, page
+import orjson
 
 router = APIRouter()
 
@@ -15,13 +19,14 @@ class FreightForwarderResponse(BaseModel):
     name: str
     website: Optional[str]
     logo_url: Optional[str]
+    average_rating: Optional[float] = None
+    review_count: int = 0
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class BranchResponse(BaseModel):
-    id: str
+    id: UUID
     name: str
     location: str
     address: Optional[str]
@@ -29,49 +34,71 @@ class BranchResponse(BaseModel):
     email: Optional[str]
     is_active: bool
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 @router.get("/", response_model=List[FreightForwarderResponse])
 async def get_freight_forwarders(
+    response: Response,
+    cursor: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get list of freight forwarders with optional search"""
-    query = db.query(FreightForwarder)
+    query = select(FreightForwarder)
     
     if search:
-        query = query.filter(FreightForwarder.name.ilike(f"%{search}%"))
+        query = query.where(FreightForwarder.name.ilike(f"%{search}%"))
     
-    freight_forwarders = query.offset(skip).limit(limit).all()
-    return [FreightForwarderResponse.from_orm(ff) for ff in freight_forwarders]
+    result = await db.execute(paginate(query, FreightForwarder, cursor, skip, limit))
+    freight_forwarders = page(result.scalars().all(), limit, response)
+    return [FreightForwarderResponse.model_validate(ff) for ff in freight_forwarders]
+
+# Forwarder details and branches change rarely but are read on every
+# profile view, so cache the serialized responses (read-through)
+FREIGHT_FORWARDER_CACHE_TTL = 300
 
 @router.get("/{freight_forwarder_id}", response_model=FreightForwarderResponse)
 async def get_freight_forwarder(
-    freight_forwarder_id: str,
-    db: Session = Depends(get_db)
+    freight_forwarder_id: UUID,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get specific freight forwarder by ID"""
-    freight_forwarder = db.query(FreightForwarder).filter(
-        FreightForwarder.id == freight_forwarder_id
-    ).first()
+    cache_key = f"ff:{freight_forwarder_id}"
+    cached = await cache_get(cache_key)
+    if cached:
+        return orjson.loads(cached)
+    
+    freight_forwarder = await db.get(FreightForwarder, freight_forwarder_id)
     
     if not freight_forwarder:
         raise HTTPException(status_code=404, detail="Freight forwarder not found")
     
-    return FreightForwarderResponse.from_orm(freight_forwarder)
+    response = FreightForwarderResponse.model_validate(freight_forwarder)
+    await cache_set(cache_key, response.model_dump_json().encode(), FREIGHT_FORWARDER_CACHE_TTL)
+    return response
 
 @router.get("/{freight_forwarder_id}/branches", response_model=List[BranchResponse])
 async def get_freight_forwarder_branches(
-    freight_forwarder_id: str,
-    db: Session = Depends(get_db)
+    freight_forwarder_id: UUID,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get branches for a specific freight forwarder"""
-    branches = db.query(Branch).filter(
+    cache_key = f"ff:{freight_forwarder_id}:branches"
+    cached = await cache_get(cache_key)
+    if cached:
+        return orjson.loads(cached)
+    
+    result = await db.execute(select(Branch).where(
         Branch.freight_forwarder_id == freight_forwarder_id,
         Branch.is_active == True
-    ).all()
+    ))
+    branches = [BranchResponse.model_validate(branch) for branch in result.scalars().all()]
     
-    return [BranchResponse.from_orm(branch) for branch in branches] 
\ No newline at end of file
+    await cache_set(
+        cache_key,
+        orjson.dumps([branch.model_dump(mode="json") for branch in branches]),
+        FREIGHT_FORWARDER_CACHE_TTL
+    )
+    return branches 
\ No newline at end of file
@@ -0,0 +1,76 @@
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Sequence
+from uuid import UUID
+import base64
+import struct
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Response header carrying the total number of matches (first page only)
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# Cursor layout: created_at as epoch microseconds + the 16 id bytes, which
+# base64url-encodes to 32 characters
+_CURSOR_FORMAT = ">q16s"
+# Rating-ordered lists: the rating as a double + the 16 id bytes
+_RATING_CURSOR_FORMAT = ">d16s"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _pack(fmt: str, *values) -> str:
+    """Pack values into an unpadded base64url cursor"""
+    return base64.urlsafe_b64encode(struct.pack(fmt, *values)).decode().rstrip("=")
+
+def _unpack(fmt: str, cursor: str) -> tuple:
+    """Unpack a cursor made by _pack, rejecting malformed input with a 400"""
+    try:
+        return struct.unpack(fmt, base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, struct.error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def encode_cursor(row) -> str:
+    """Encode a row's (created_at, id) ordering key as an opaque cursor"""
+    micros = (row.created_at - _EPOCH) // timedelta(microseconds=1)
+    return _pack(_CURSOR_FORMAT, micros, row.id.bytes)
+
+def decode_cursor(cursor: str):
+    """Decode a cursor back into its (created_at, id) ordering key"""
+    micros, id_bytes = _unpack(_CURSOR_FORMAT, cursor)
+    try:
+        return _EPOCH + timedelta(microseconds=micros), UUID(bytes=id_bytes)
+    except OverflowError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def encode_rating_cursor(rating: float, row_id: UUID) -> str:
+    """Encode a (rating, id) ordering key as an opaque cursor"""
+    return _pack(_RATING_CURSOR_FORMAT, rating, row_id.bytes)
+
+def decode_rating_cursor(cursor: str):
+    """Decode a cursor back into its (rating, id) ordering key"""
+    rating, id_bytes = _unpack(_RATING_CURSOR_FORMAT, cursor)
+    return rating, UUID(bytes=id_bytes)
+
+def paginate(query, model, cursor: Optional[str], skip: int, limit: int):
+    """Order by (created_at, id) and continue after the cursor, fetching one row ahead"""
+    query = query.order_by(model.created_at, model.id)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) > tuple_(created_at, last_id))
+    elif skip:
+        # Offset paging is kept for existing clients; prefer the cursor
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+def page(rows: Sequence, limit: int, response: Response, key: Callable = lambda row: row) -> Sequence:
+    """Drop the look-ahead row and expose the next cursor when there is one"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(rows[-1]))
+    return rows
\ No newline at end of file
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
+from datetime import datetime
+from uuid import UUID
+import orjson
 from database.database import get_db
+from database.cache import cache_delete
 from database.models import Review, ReviewCategoryScore, User
-from auth.auth import get_current_user
+from auth.auth import get_current_user, CurrentUser
 
 router = APIRouter()
 
@@ -20,52 +26,80 @@ class ReviewRequest(BaseModel):
     is_anonymous: bool = False
     category_scores: List[ReviewCategoryScoreRequest]
 
+class ReviewerResponse(BaseModel):
+    id: UUID
+    username: Optional[str]
+    full_name: Optional[str]
+    avatar_url: Optional[str]
+
+    model_config = ConfigDict(from_attributes=True)
+
 class ReviewResponse(BaseModel):
-    id: str
+    id: UUID
     overall_rating: float
     review_text: Optional[str]
     is_anonymous: bool
     is_verified: bool
-    created_at: str
-    user: Optional[dict] = None
+    created_at: datetime
+    user: Optional[ReviewerResponse] = None
+
+    model_config = ConfigDict(from_attributes=True)
 
-    class Config:
-        from_attributes = True
+# Load only the columns ReviewResponse reads, with the reviewer joined in
+# (async sessions can't lazy load)
+REVIEW_RESPONSE_LOAD = (
+    load_only(
+        Review.id, Review.overall_rating, Review.review_text,
+        Review.is_anonymous, Review.is_verified, Review.created_at
+    ),
+    joinedload(Review.user).load_only(User.id, User.username, User.full_name, User.avatar_url)
+)
+
+def _review_response(review: Review, user=None) -> dict:
+    """Build a review response, hiding the reviewer on anonymous reviews"""
+    user = user or review.user
+    return {
+        "id": str(review.id),
+        "overall_rating": review.overall_rating,
+        "review_text": review.review_text,
+        "is_anonymous": review.is_anonymous,
+        "is_verified": review.is_verified,
+        "created_at": review.created_at,
+        "user": None if review.is_anonymous or user is None else {
+            "id": str(user.id),
+            "username": user.username,
+            "full_name": user.full_name,
+            "avatar_url": user.avatar_url
+        }
+    }
 
 @router.get("/", response_model=List[ReviewResponse])
 async def get_reviews(
     freight_forwarder_id: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get reviews with optional freight forwarder filter"""
-    query = db.query(Review).filter(Review.is_active == True)
+    query = select(Review).options(*REVIEW_RESPONSE_LOAD).where(Review.is_active == True)
     
     if freight_forwarder_id:
-        query = query.filter(Review.freight_forwarder_id == freight_forwarder_id)
+        query = query.where(Review.freight_forwarder_id == freight_forwarder_id)
     
-    reviews = query.offset(skip).limit(limit).all()
+    result = await db.execute(query.offset(skip).limit(limit))
+    reviews = result.scalars().all()
     
-    review_responses = []
-    for review in reviews:
-        review_data = ReviewResponse.from_orm(review)
-        if not review.is_anonymous:
-            review_data.user = {
-                "id": str(review.user.id),
-                "username": review.user.username,
-                "full_name": review.user.full_name,
-                "avatar_url": review.user.avatar_url
-            }
-        review_responses.append(review_data)
-    
-    return review_responses
+    # Rows are built from loaded columns already; skip re-validating
+    # them against response_model and serialize directly (UTC as "Z",
+    # matching the validated single-review responses)
+    content = orjson.dumps([_review_response(review) for review in reviews], option=orjson.OPT_UTC_Z)
+    return Response(content, media_type="application/json")
 
 @router.post("/", response_model=ReviewResponse)
 async def create_review(
     review_request: ReviewRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new review"""
     # Validate overall rating
@@ -88,44 +122,40 @@ async def create_review(
     )
     
     db.add(review)
-    db.commit()
-    db.refresh(review)
+    # Flush to get the generated id; review and scores commit together
+    await db.flush()
     
-    # Create category scores
-    for category_score in review_request.category_scores:
-        score = ReviewCategoryScore(
-            review_id=review.id,
-            category=category_score.category,
-            score=category_score.score
-        )
-        db.add(score)
+    # Create category scores in one multi-row INSERT
+    if review_request.category_scores:
+        await db.execute(insert(ReviewCategoryScore), [
+            {
+                "review_id": review.id,
+                "category": category_score.category,
+                "score": category_score.score
+            }
+            for category_score in review_request.category_scores
+        ])
     
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    # The cached forwarder detail carries average_rating and review_count
+    await cache_delete(f"ff:{review_request.freight_forwarder_id}")
     
-    return ReviewResponse.from_orm(review)
+    # The reviewer is the authenticated user, no need to load it again
+    return _review_response(review, current_user)
 
 @router.get("/{review_id}", response_model=ReviewResponse)
 async def get_review(
     review_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get specific review by ID"""
-    review = db.query(Review).filter(
+    result = await db.execute(select(Review).options(*REVIEW_RESPONSE_LOAD).where(
         Review.id == review_id,
         Review.is_active == True
-    ).first()
+    ))
+    review = result.scalar_one_or_none()
     
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     
-    review_data = ReviewResponse.from_orm(review)
-    if not review.is_anonymous:
-        review_data.user = {
-            "id": str(review.user.id),
-            "username": review.user.username,
-            "full_name": review.user.full_name,
-            "avatar_url": review.user.avatar_url
-        }
-    
-    return review_data 
\ No newline at end of file
+    return _review_response(review) 
\ No newline at end of file
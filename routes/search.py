@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
+import re
+import orjson
 from database.database import get_db
+from database.cache import cache_get, cache_set
 from database.models import FreightForwarder
+from routes.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, encode_rating_cursor, decode_rating_cursor
 
 router = APIRouter()
 
@@ -12,45 +18,127 @@ class SearchResult(BaseModel):
     name: str
     website: Optional[str]
     logo_url: Optional[str]
+    average_rating: Optional[float]
+    review_count: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+# Popular queries repeat; results may be slightly stale (new reviews and
+# companies show up once the entry expires)
+SEARCH_CACHE_TTL = 60
+SUGGESTIONS_CACHE_TTL = 300
+
+def _prefix_tsquery(q: str):
+    """Match every word of q as a prefix, e.g. "kuehne nag" -> kuehne:* & nag:*"""
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+
+# Best rated first, unrated last; -1 stands in for NULL so the key can be
+# compared as a row value for keyset pagination
+RATING_SORT_KEY = func.coalesce(FreightForwarder.average_rating, literal_column("-1"))
+
+def _json_page(content: bytes, headers: dict) -> Response:
+    """JSON response with pagination headers"""
+    return Response(content, media_type="application/json", headers=headers)
 
 @router.get("/freight-forwarders", response_model=List[SearchResult])
 async def search_freight_forwarders(
     q: Optional[str] = Query(None, description="Search query"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5, description="Minimum average rating"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
     limit: int = Query(20, ge=1, le=100, description="Number of results"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Search freight forwarders by name"""
+    q = q.strip().lower() if q else None
+    tsquery = _prefix_tsquery(q) if q else None
+    if q and tsquery is None:
+        # Nothing searchable in q (e.g. only punctuation), so nothing matches
+        headers = {} if cursor else {TOTAL_COUNT_HEADER: "0"}
+        return _json_page(b"[]", headers)
+    
+    cache_key = f"search:ff:{limit}:{min_rating}:{cursor or ''}:{q or ''}"
+    cached = await cache_get(cache_key)
+    if cached:
+        # Cached as "<headers json>\n<body json>"
+        headers, _, content = cached.partition(b"\n")
+        return _json_page(content, orjson.loads(headers))
+    
+    query = select(FreightForwarder).options(load_only(
+        FreightForwarder.id, FreightForwarder.name, FreightForwarder.website,
+        FreightForwarder.logo_url, FreightForwarder.average_rating, FreightForwarder.review_count
+    ))
+    
+    if tsquery is not None:
+        query = query.where(FreightForwarder.search_tsv.bool_op("@@")(tsquery))
+    
+    if min_rating is not None:
+        query = query.where(FreightForwarder.average_rating >= min_rating)
+    
+    # Keyset pagination: seek past the last row instead of OFFSET
+    if cursor:
+        rating, last_id = decode_rating_cursor(cursor)
+        query = query.where(tuple_(RATING_SORT_KEY, FreightForwarder.id) < tuple_(rating, last_id))
+    
+    else:
+        # First page: count all matches in the same query
+        query = query.add_columns(func.count().over().label("total_count"))
+    
+    query = query.order_by(RATING_SORT_KEY.desc(), FreightForwarder.id.desc())
     
-    query = db.query(FreightForwarder)
+    # Fetch one row ahead to know whether there is a next page
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    results = [row[0] for row in rows]
     
-    if q:
-        query = query.filter(FreightForwarder.name.ilike(f"%{q}%"))
+    headers = {}
+    if not cursor:
+        headers[TOTAL_COUNT_HEADER] = str(rows[0].total_count if rows else 0)
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_rating_cursor(
+            last.average_rating if last.average_rating is not None else -1,
+            last.id
+        )
     
-    results = query.limit(limit).all()
+    # Serialize once and return the bytes directly (skipping response_model
+    # validation); the same bytes are cached for later hits
+    content = orjson.dumps([
+        {
+            "id": str(ff.id),
+            "name": ff.name,
+            "website": ff.website,
+            "logo_url": ff.logo_url,
+            "average_rating": ff.average_rating,
+            "review_count": ff.review_count
+        } for ff in results
+    ])
     
-    return [
-        SearchResult(
-            id=str(ff.id),
-            name=ff.name,
-            website=ff.website,
-            logo_url=ff.logo_url
-        ) for ff in results
-    ]
+    await cache_set(cache_key, orjson.dumps(headers) + b"\n" + content, SEARCH_CACHE_TTL)
+    return _json_page(content, headers)
 
 @router.get("/suggestions")
 async def get_search_suggestions(
     q: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(10, ge=1, le=50, description="Number of suggestions"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get search suggestions for freight forwarder names"""
+    q = q.lower()
+    cache_key = f"search:suggest:{limit}:{q}"
+    cached = await cache_get(cache_key)
+    if cached:
+        return orjson.loads(cached)
     
-    suggestions = db.query(FreightForwarder.name)\
-        .filter(FreightForwarder.name.ilike(f"%{q}%"))\
-        .limit(limit)\
-        .all()
+    result = await db.execute(
+        select(FreightForwarder.name)
+        .where(FreightForwarder.name.ilike(f"%{q}%"))
+        .limit(limit)
+    )
+    suggestions = result.scalars().all()
     
-    return [suggestion[0] for suggestion in suggestions] 
\ No newline at end of file
+    await cache_set(cache_key, orjson.dumps(suggestions), SUGGESTIONS_CACHE_TTL)
+    return suggestions 
\ No newline at end of file
@@ -1,26 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ConfigDict, field_validator
 from typing import Optional
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone
+import hashlib
+import hmac
+import logging
 import os
-import uuid
-from passlib.context import CryptContext
+import secrets
+import time
+from urllib.parse import urlencode
 
 from database.database import get_db
 from database.models import User
 from auth.auth import (
     get_current_user, 
+    invalidate_user,
+    CurrentUser,
     create_access_token, 
+    revoke_token,
+    security,
     authenticate_github_user,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    averify_password,
+    averify_and_update_password,
+    aget_password_hash,
+    ACCESS_TOKEN_EXPIRES,
+    DUMMY_PASSWORD_HASH,
+    pad_failed_signin,
+    USER_CREDENTIALS_BY_EMAIL,
+    USER_RESET_BY_EMAIL,
+    rate_limit
 )
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 class GitHubAuthRequest(BaseModel):
     code: str
 
@@ -59,260 +77,263 @@ class UserResponse(BaseModel):
     is_verified: bool
     is_active: bool
 
-    class Config:
-        from_attributes = True
-        
+    model_config = ConfigDict(from_attributes=True)
+    
+    @field_validator("id", mode="before")
     @classmethod
-    def from_orm(cls, obj):
+    def _id_to_str(cls, value):
         # Convert UUID to string for the id field
-        data = {
-            'id': str(obj.id),
-            'email': obj.email,
-            'username': obj.username,
-            'full_name': obj.full_name,
-            'avatar_url': obj.avatar_url,
-            'company_name': obj.company_name,
-            'user_type': obj.user_type,
-            'subscription_tier': obj.subscription_tier,
-            'is_verified': obj.is_verified,
-            'is_active': obj.is_active
-        }
-        return cls(**data)
+        return str(value)
 
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
 
+def _hash_reset_token(reset_token: str) -> str:
+    """Digest stored in place of a reset token, so a DB dump holds no usable tokens"""
+    # The token is 256 random bits, so a plain (unkeyed) hash can't be brute forced
+    return hashlib.sha256(reset_token.encode()).hexdigest()
+
+def _token_response(user) -> TokenResponse:
+    """Issue an access token for a signed-in user"""
+    access_token = create_access_token(
+        data={"sub": str(user.id), "ver": user.token_version}, expires_delta=ACCESS_TOKEN_EXPIRES
+    )
+    return TokenResponse(
+        access_token=access_token,
+        token_type="bearer",
+        user=UserResponse.model_validate(user)
+    )
+
+# Per-IP limits on the routes that hash passwords or issue reset tokens,
+# so a single client can't pin the hashing pool
+AUTH_RATE_WINDOW = 60  # seconds
+SIGNUP_RATE_LIMIT = Depends(rate_limit("signup", 10, AUTH_RATE_WINDOW))
+SIGNIN_RATE_LIMIT = Depends(rate_limit("signin", 20, AUTH_RATE_WINDOW))
+FORGOT_PASSWORD_RATE_LIMIT = Depends(rate_limit("forgot", 5, AUTH_RATE_WINDOW))
+RESET_PASSWORD_RATE_LIMIT = Depends(rate_limit("reset", 5, AUTH_RATE_WINDOW))
+
+# GitHub OAuth authorize URL, built once; redirect_uri is the frontend callback
+GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
+GITHUB_REDIRECT_URI = os.getenv("GITHUB_REDIRECT_URI", "https://logiscore-frontend.vercel.app/callback")
+GITHUB_AUTH_URL = (
+    "https://github.com/login/oauth/authorize?" + urlencode({
+        "client_id": GITHUB_CLIENT_ID,
+        "redirect_uri": GITHUB_REDIRECT_URI,
+        "scope": "user:email"
+    })
+    if GITHUB_CLIENT_ID else None
+)
+
 @router.get("/github/auth")
 async def get_github_auth_url():
     """Get GitHub OAuth authorization URL"""
-    github_client_id = os.getenv("GITHUB_CLIENT_ID")
-    if not github_client_id:
+    if not GITHUB_AUTH_URL:
         raise HTTPException(status_code=500, detail="GitHub OAuth not configured")
     
-    # Redirect URL should be your frontend callback URL
-    redirect_uri = "https://logiscore-frontend.vercel.app/callback"
-    auth_url = f"https://github.com/login/oauth/authorize?client_id={github_client_id}&redirect_uri={redirect_uri}&scope=user:email"
-    
-    return {"auth_url": auth_url}
+    return {"auth_url": GITHUB_AUTH_URL}
 
+# One handler for both GitHub login paths
 @router.post("/github/callback", response_model=TokenResponse)
-async def github_callback(
-    auth_request: GitHubAuthRequest,
-    db: Session = Depends(get_db)
-):
-    """Handle GitHub OAuth callback"""
-    try:
-        user = await authenticate_github_user(auth_request.code, db)
-        
-        # Create access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": str(user.id)}, expires_delta=access_token_expires
-        )
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            user=UserResponse.from_orm(user)
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Authentication failed: {str(e)}"
-        )
-
 @router.post("/auth/github", response_model=TokenResponse)
 async def github_auth(
     auth_request: GitHubAuthRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Authenticate user with GitHub OAuth"""
     try:
         user = await authenticate_github_user(auth_request.code, db)
-        
-        # Create access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": str(user.id)}, expires_delta=access_token_expires
-        )
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            user=UserResponse.from_orm(user)
-        )
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("GitHub auth error")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Authentication failed: {str(e)}"
+            detail="Authentication failed"
         )
+    
+    return _token_response(user)
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: CurrentUser = Depends(get_current_user)):
     """Get current user information"""
-    return UserResponse.from_orm(current_user)
+    # response_model validates the snapshot directly, no intermediate model
+    return current_user
+
+@router.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the current access token"""
+    await revoke_token(credentials.credentials)
+    return {"message": "Logged out successfully"}
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse.from_orm(user)
+    return user
 
-@router.post("/signup", response_model=TokenResponse)
+@router.post("/signup", response_model=TokenResponse, dependencies=[SIGNUP_RATE_LIMIT])
 async def signup(
     signup_request: SignupRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Register a new user with email/password"""
     try:
-        # Check if user already exists
-        existing_user = db.query(User).filter(User.email == signup_request.email).first()
-        if existing_user:
+        # Hash password
+        hashed_password = await aget_password_hash(signup_request.password)
+        
+        # Create new user; the unique email constraint rejects duplicates
+        # atomically, no separate existence check
+        result = await db.execute(
+            pg_insert(User)
+            .values(
+                email=signup_request.email,
+                username=signup_request.name,
+                full_name=signup_request.name,
+                company_name=signup_request.company,
+                hashed_password=hashed_password,
+                user_type=signup_request.user_type,
+                subscription_tier="free",
+                is_verified=False,
+                is_active=True
+            )
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User)
+        )
+        user = result.scalar_one_or_none()
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User with this email already exists"
             )
-        
-        # Hash password
-        hashed_password = pwd_context.hash(signup_request.password)
-        
-        # Create new user
-        user = User(
-            id=str(uuid.uuid4()),
-            email=signup_request.email,
-            username=signup_request.name,
-            full_name=signup_request.name,
-            company_name=signup_request.company,
-            hashed_password=hashed_password,
-            user_type=signup_request.user_type,
-            subscription_tier="free",
-            is_verified=False,
-            is_active=True
-        )
-        
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        
-        # Create access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": str(user.id)}, expires_delta=access_token_expires
-        )
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            user=UserResponse.from_orm(user)
-        )
-    except Exception as e:
-        import logging
-        logging.error(f"Signup error: {str(e)}")
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        logger.exception("Signup error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Signup failed: {str(e)}"
+            detail="Signup failed"
         )
+    
+    return _token_response(user)
 
-@router.post("/signin", response_model=TokenResponse)
+@router.post("/signin", response_model=TokenResponse, dependencies=[SIGNIN_RATE_LIMIT])
 async def signin(
     signin_request: SigninRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Authenticate user with email/password"""
+    started = time.monotonic()
     try:
         # Find user by email
-        user = db.query(User).filter(User.email == signin_request.email).first()
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid email or password"
-            )
+        result = await db.execute(USER_CREDENTIALS_BY_EMAIL, {"email": signin_request.email})
+        user = result.scalar_one_or_none()
         
-        # Verify password
-        if not pwd_context.verify(signin_request.password, user.hashed_password):
+        # Verify password; always hash, even for unknown emails or accounts
+        # without a password, so the response time is the same either way
+        has_password = bool(user and user.hashed_password)
+        verified, new_hash = await averify_and_update_password(
+            signin_request.password,
+            user.hashed_password if has_password else DUMMY_PASSWORD_HASH
+        )
+        if not has_password or not verified:
+            # Release the connection before waiting out the failure floor
+            await db.rollback()
+            await pad_failed_signin(started)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
-        # Create access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": str(user.id)}, expires_delta=access_token_expires
-        )
-        
-        return TokenResponse(
-            access_token=access_token,
-            token_type="bearer",
-            user=UserResponse.from_orm(user)
-        )
-    except Exception as e:
-        import logging
-        logging.error(f"Signin error: {str(e)}")
+        # Rehash with the preferred scheme if the stored hash is deprecated
+        if new_hash:
+            user.hashed_password = new_hash
+            await db.commit()
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Signin error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Signin failed: {str(e)}"
+            detail="Signin failed"
         )
+    
+    return _token_response(user)
 
 @router.post("/change-password")
 async def change_password(
     change_request: ChangePasswordRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Change user password"""
     try:
-        # Verify current password
-        if not pwd_context.verify(change_request.current_password, current_user.hashed_password):
+        # get_current_user returns a cached snapshot, so load the row to update
+        user = await db.get(User, current_user.id)
+        if not await averify_password(change_request.current_password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
         
         # Hash new password
-        new_hashed_password = pwd_context.hash(change_request.new_password)
-        
-        # Update password in database
-        current_user.hashed_password = new_hashed_password
-        db.commit()
+        new_hashed_password = await aget_password_hash(change_request.new_password)
         
-        return {"message": "Password changed successfully"}
-    except Exception as e:
-        import logging
-        logging.error(f"Change password error: {str(e)}")
+        # Update password in database and revoke previously issued tokens
+        user.hashed_password = new_hashed_password
+        user.token_version += 1
+        await db.commit()
+        invalidate_user(user.id)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Change password error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Password change failed: {str(e)}"
+            detail="Password change failed"
         )
+    
+    # Replacement token so the current client stays signed in
+    access_token = create_access_token(
+        data={"sub": str(user.id), "ver": user.token_version}, expires_delta=ACCESS_TOKEN_EXPIRES
+    )
+    return {
+        "message": "Password changed successfully",
+        "access_token": access_token,
+        "token_type": "bearer"
+    }
 
-@router.post("/forgot-password")
+@router.post("/forgot-password", dependencies=[FORGOT_PASSWORD_RATE_LIMIT])
 async def forgot_password(
     forgot_request: ForgotPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Send password reset email"""
     try:
-        # Find user by email
-        user = db.query(User).filter(User.email == forgot_request.email).first()
-        if not user:
-            # Don't reveal if user exists or not for security
-            return {"message": "If the email exists, a reset link has been sent"}
-        
         # Generate reset token (simple implementation - in production, use proper email service)
-        reset_token = str(uuid.uuid4())
+        reset_token = secrets.token_urlsafe(32)
         
-        # Store reset token in user record (you might want a separate table for this)
-        # For now, we'll use a simple approach
-        user.reset_token = reset_token
-        user.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
-        db.commit()
+        # Store reset token in user record (you might want a separate table for this);
+        # one UPDATE finds the user and sets the token
+        result = await db.execute(
+            update(User)
+            .where(User.email == forgot_request.email)
+            .values(reset_token=_hash_reset_token(reset_token), reset_token_expires=datetime.now(timezone.utc) + timedelta(hours=1))
+            .returning(User.id)
+        )
+        if result.scalar_one_or_none() is None:
+            # Don't reveal if user exists or not for security
+            return {"message": "If the email exists, a reset link has been sent"}
+        await db.commit()
         
         # In production, send email here
         # For now, just return the token (in production, send via email)
@@ -321,57 +342,62 @@ async def forgot_password(
             "reset_token": reset_token,  # Remove this in production
             "expires_in": "1 hour"
         }
-    except Exception as e:
-        import logging
-        logging.error(f"Forgot password error: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Forgot password error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Password reset request failed: {str(e)}"
+            detail="Password reset request failed"
         )
 
-@router.post("/reset-password")
+@router.post("/reset-password", dependencies=[RESET_PASSWORD_RATE_LIMIT])
 async def reset_password(
     reset_request: ResetPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Reset password using reset token"""
     try:
         # Find user by email
-        user = db.query(User).filter(User.email == reset_request.email).first()
+        result = await db.execute(USER_RESET_BY_EMAIL, {"email": reset_request.email})
+        user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid email or reset token"
             )
         
-        # Verify reset token
-        if not user.reset_token or user.reset_token != reset_request.reset_token:
+        # Verify reset token (constant-time, so timing doesn't leak a prefix match)
+        if not user.reset_token or not hmac.compare_digest(user.reset_token, _hash_reset_token(reset_request.reset_token)):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid reset token"
             )
         
         # Check if token is expired
-        if user.reset_token_expires and user.reset_token_expires < datetime.utcnow():
+        if user.reset_token_expires and user.reset_token_expires < datetime.now(timezone.utc):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Reset token has expired"
             )
         
         # Hash new password
-        new_hashed_password = pwd_context.hash(reset_request.new_password)
+        new_hashed_password = await aget_password_hash(reset_request.new_password)
         
         # Update password and clear reset token
         user.hashed_password = new_hashed_password
         user.reset_token = None
         user.reset_token_expires = None
-        db.commit()
+        user.token_version += 1
+        await db.commit()
+        invalidate_user(user.id)
         
         return {"message": "Password reset successfully"}
-    except Exception as e:
-        import logging
-        logging.error(f"Reset password error: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Reset password error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Password reset failed: {str(e)}"
+            detail="Password reset failed"
         ) 
\ No newline at end of file